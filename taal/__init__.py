@@ -6,13 +6,19 @@
 from __future__ import absolute_import
 
 from abc import ABCMeta, abstractmethod, abstractproperty
+from collections import OrderedDict, defaultdict, namedtuple
 
-from sqlalchemy import func
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy.sql.expression import and_, or_, desc
+from sqlalchemy import case, distinct, func, literal
+from sqlalchemy.orm import Session, aliased, scoped_session, sessionmaker
+from sqlalchemy.sql.expression import and_, or_, desc, select
 
 from taal import strategies
+from taal.constants import SUMMARY_TOTAL
 from taal.exceptions import BindError
+from taal.translatablestring import TranslatableString
+from taal.utils import (
+    DEFAULT_CHUNK_SIZE, UPSERT_DIALECTS, Upsert, chunked, key_filter,
+    keyset_filter, prefix_filter, value_hash)
 
 try:
     VERSION = __import__('pkg_resources').get_distribution('taal').version
@@ -23,6 +29,9 @@ NULL = None  # for pep8
 
 TRANSLATION_MISSING = strategies.TRANSLATION_MISSING
 
+SaveResult = namedtuple('SaveResult', ['written', 'skipped'])
+Coverage = namedtuple('Coverage', ['total', 'translated'])
+
 
 class TranslationStrategies(object):
     NONE_VALUE = strategies.NoneStrategy()
@@ -38,6 +47,15 @@ class Translator(object):
     a language, bind a translator to a(n other) sqlalchemy session
     and/or a kaiso manager to get translation magic
 
+    Instead of a session, the translator may be given a ``sessionmaker``
+    (e.g. bound to a dedicated engine), in which case it creates a session
+    per thread, independent of the application's sessions and connections.
+    A ``scoped_session`` (or any other callable returning a session) is
+    called for each use, and the sessions it returns are left to the
+    application. Lookups may be routed elsewhere (e.g. to a read replica) by
+    passing ``read_session``, taking the same kinds of arguments. Writes
+    always use ``session``.
+
     Language may be either a string, or a callable returning a string, for
     more dynamic behaviour.
 
@@ -59,15 +77,80 @@ class Translator(object):
         :attr:`Translator.strategies.DEBUG_VALUE` : Return a debug value (a
             string indicating a translating is missing, including context
             information)
+
+    Bulk lookups
+    ------------
+    Translations are looked up in bulk, matching on (context, message_id).
+    Very large lookups are split into chunks of at most `chunk_size` keys
+    to keep statement size (and the number of bound parameters) in check.
+
+    Caching
+    -------
+    A process-wide :class:`taal.cache.TranslationCache` may be passed as
+    `shared_cache`. Lookups are then served from the cache where possible,
+    and only misses are loaded from the database. Writes through the
+    translator invalidate the affected cache entries.
+
+    Write-behind
+    ------------
+    Writes may be handed to a :class:`taal.writebehind.WriteBehindQueue`,
+    passed as `write_behind`, to be written in the background. Queued
+    writes are visible to lookups through this translator straight away.
+    Queuing doesn't touch the translator's session (so `commit` has no
+    effect); the queue's worker commits, and invalidates the shared cache.
+    Moving translations flushes the queue, and is still done synchronously.
+
+    Skipping unchanged values
+    -------------------------
+    With `skip_unchanged`, `save_translations` first loads the stored values
+    (in bulk) and only writes translations whose value actually changed.
+
+    Coverage
+    --------
+    `coverage` counts translations per context in the database. Given a
+    `summary_model` (see :class:`taal.models.TranslationSummaryMixin`), the
+    translator keeps counts up to date on every write, and `coverage` reads
+    them from there instead. Populate it initially with `rebuild_summary`.
+    Rows the counts are derived from are read with ``SELECT ... FOR
+    UPDATE``. Databases that don't lock missing rows (e.g. PostgreSQL,
+    unlike MySQL's gap locks) can still count a (context, message_id)
+    created by two concurrent writers twice, so with concurrent writers
+    run `rebuild_summary` periodically there.
+
+    Suggestion index
+    ----------------
+    Given a `suggestion_model` (see
+    :class:`taal.models.TranslationSuggestionMixin`), the translator keeps an
+    index of candidate suggestions up to date on every write, and
+    `suggest_translations` looks suggestions up there rather than
+    aggregating over the translations table. Populate it initially with
+    `rebuild_suggestion_index`. The index has a row per ordered pair of
+    languages a message id is translated into, i.e. O(L^2) rows per message
+    id for L languages.
     """
     strategies = TranslationStrategies
 
     def __init__(
         self, model, session, language, strategy=strategies.NONE_VALUE,
+        chunk_size=DEFAULT_CHUNK_SIZE, shared_cache=None, write_behind=None,
+        skip_unchanged=False, read_session=None, summary_model=None,
+        suggestion_model=None,
     ):
         self.model = model
-        self.session = session
+        self._session, self._owns_session = get_session_registry(session)
+        if read_session is None:
+            self._read_session = None
+            self._owns_read_session = False
+        else:
+            self._read_session, self._owns_read_session = (
+                get_session_registry(read_session))
         self.strategy = strategy
+        self.chunk_size = chunk_size
+        self.shared_cache = shared_cache
+        self.write_behind = write_behind
+        self.skip_unchanged = skip_unchanged
+        self.summary_model = summary_model
+        self.suggestion_model = suggestion_model
 
         if callable(language):
             self.get_language = language
@@ -78,6 +161,34 @@ class Translator(object):
     def language(self):
         return self.get_language()
 
+    @property
+    def session(self):
+        """ Session for writes (and reads, unless ``read_session`` given) """
+        return self._session()
+
+    @property
+    def read_session(self):
+        if self._read_session is None:
+            return self.session
+        return self._read_session()
+
+    def close(self):
+        """ Close sessions created by the translator (for this thread)
+
+        Sessions passed in (or returned by a ``scoped_session`` passed in)
+        are left alone
+        """
+        if self._owns_session:
+            self._session.remove()
+        if self._owns_read_session:
+            self._read_session.remove()
+
+    def _end_read(self):
+        # don't hold a connection (and transaction) to a separate read db
+        # open between lookups
+        if self._owns_read_session:
+            self._read_session().close()
+
     def bind(self, target):
         """ register e.g. a sqlalchey session or a kaiso manager """
         from taal.kaiso import manager
@@ -92,9 +203,11 @@ class Translator(object):
         else:
             raise BindError("Unknown target {}".format(target))
 
-    def _get_debug_translation(self, translatable):
+    def _get_debug_translation(self, translatable, language=None):
+        if language is None:
+            language = self.language
         return u"[Translation missing ({}, {}, {})]".format(
-            self.language, translatable.context, translatable.message_id)
+            language, translatable.context, translatable.message_id)
 
     def translate(self, translatable, strategy=None, cache=None):
         """
@@ -102,16 +215,73 @@ class Translator(object):
 
         can also take a 'structure' (currently lists, tuples, and dicts)
         and recursively translate any TranslatableStrings found.
+
+        All translations required for the structure are loaded with a
+        single query (or one query per ``chunk_size`` keys).
+
+        ``cache`` may be a :class:`taal.cache.TranslationCache` scoped to
+        e.g. a web request, and shared between all ``translate`` calls
+        made while handling it. Translations already loaded into it are
+        not queried again.
+        """
+        try:
+            return self._bind(strategy, cache).recursive_translate(
+                translatable)
+        finally:
+            self._end_read()
+
+    def translate_iter(
+            self, iterable, strategy=None, cache=None, window_size=100):
+        """
+        Lazily translate the items of ``iterable`` (e.g. a
+        ``Query.yield_per`` result)
+
+        Items are consumed ``window_size`` at a time, and translations for
+        each window loaded with a single query, so memory use doesn't
+        depend on the size of ``iterable``. Items may be any structure
+        accepted by ``translate``
+        """
+        lookup = self._bind(strategy, cache)
+        for window in chunked(iterable, window_size):
+            try:
+                translated = lookup.recursive_translate(window)
+            finally:
+                self._end_read()
+            for item in translated:
+                yield item
+
+    def translate_multi(
+            self, translatable, languages, strategy=None, cache=None):
         """
+        Translate ``translatable`` into each of ``languages``
+
+        returns a dict of {language: translation}. The 'structure' is
+        walked, and translations for all languages loaded, only once
+        """
+        if not languages:
+            return {}
+
+        lookup = self._bind(strategy, cache, language=languages[0])
+        try:
+            return lookup.recursive_translate_multi(translatable, languages)
+        finally:
+            self._end_read()
+
+    def _bind(self, strategy, cache, language=None):
         if strategy is None:
             strategy = self.strategy
+        if language is None:
+            language = self.language
 
-        return (
-            strategy.bind_params(self.language, self.model, self.session)
-            .recursive_translate(translatable)
-        )
+        return strategy.bind_params(
+            language, self.model, self.read_session, self.chunk_size,
+            self.shared_cache, cache, self.write_behind)
 
-    def save_translation(self, translatable, commit=True):
+    def _should_save(self, translatable, language):
+        """ Validate ``translatable`` for saving
+
+        Returns False for values that shouldn't be saved (debug values)
+        """
         if translatable.message_id is None:
             raise RuntimeError(
                 "Cannot save translatable '{}'. "
@@ -124,14 +294,38 @@ class Translator(object):
                     translatable, TRANSLATION_MISSING))
 
         if self.strategy == self.strategies.DEBUG_VALUE:
-            debug_value = self._get_debug_translation(translatable)
+            debug_value = self._get_debug_translation(translatable, language)
             if translatable.pending_value == debug_value:
-                return
+                return False
+
+        return True
+
+    def save_translation(self, translatable, commit=True):
+        language = self.language
+        if not self._should_save(translatable, language):
+            return
+
+        if self.write_behind is not None:
+            self.write_behind.save([translatable], language)
+            return
+
+        if self.summary_model is not None:
+            values = {
+                (translatable.context, translatable.message_id):
+                    translatable.pending_value,
+            }
+            stored = self._stored_values(values, language, self.chunk_size)
+            self._summarise_saves(values, stored, language)
+        if self.suggestion_model is not None:
+            self._index_saves(
+                {(translatable.context, translatable.message_id):
+                    translatable.pending_value},
+                language, self.chunk_size)
 
         translation = self.model(
             context=translatable.context,
             message_id=translatable.message_id,
-            language=self.language
+            language=language
         )
 
         # we can use merge for 'on duplicate key update'
@@ -139,21 +333,153 @@ class Translator(object):
         translation = self.session.merge(translation)
         translation.value = translatable.pending_value
 
-        if commit:
-            self.session.commit()
+        keys = [(translatable.context, translatable.message_id, language)]
+        self._commit_and_invalidate(keys, commit)
+
+    def save_translations(
+            self, translatables, language=None, chunk_size=None,
+            commit=True, skip_unchanged=None):
+        """ Save the pending values of many ``translatables`` at once
+
+        Translations are written ``chunk_size`` at a time, each chunk with
+        a single multi-row upsert (on MySQL, PostgreSQL and SQLite; other
+        dialects fall back to saving one translation at a time). Commits
+        once, at the end.
+
+        If ``translatables`` contains the same (context, message_id) more
+        than once, the last value is saved
+
+        With ``skip_unchanged`` (default: as set on the translator), values
+        equal to those stored aren't written.
+
+        Returns a ``SaveResult`` of the number of translations written and
+        skipped (or ``None`` if handed to the write-behind queue)
+        """
+        if language is None:
+            language = self.language
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        if skip_unchanged is None:
+            skip_unchanged = self.skip_unchanged
+
+        model = self.model
+        session = self.session
+
+        values = OrderedDict()
+        for translatable in translatables:
+            if not self._should_save(translatable, language):
+                continue
+            values[(translatable.context, translatable.message_id)] = (
+                translatable.pending_value)
+
+        if self.write_behind is not None:
+            self.write_behind.save([
+                TranslatableString(context, message_id, value)
+                for (context, message_id), value in values.iteritems()
+            ], language)
+            return
+
+        skipped = 0
+        if skip_unchanged or self.summary_model is not None:
+            stored = self._stored_values(values, language, chunk_size)
+        if skip_unchanged:
+            for key, value in stored.iteritems():
+                if values[key] == value:
+                    del values[key]
+                    skipped += 1
+        if self.summary_model is not None:
+            self._summarise_saves(values, stored, language)
+        if self.suggestion_model is not None:
+            self._index_saves(values, language, chunk_size)
+
+        dialect = session.get_bind(model).dialect
+        for chunk in chunked(values.iteritems(), chunk_size):
+            rows = [
+                {
+                    'context': context,
+                    'message_id': message_id,
+                    'language': language,
+                    'value': value,
+                }
+                for (context, message_id), value in chunk
+            ]
+            if dialect.name in UPSERT_DIALECTS:
+                upsert = Upsert(model.__table__, rows, ['value'])
+                session.execute(upsert, mapper=model)
+            else:
+                for row in rows:
+                    session.merge(model(**row))
+
+        keys = [
+            (context, message_id, language)
+            for context, message_id in values
+        ]
+        self._commit_and_invalidate(keys, commit)
+        return SaveResult(len(values), skipped)
+
+    def _stored_values(self, translatable_pks, language, chunk_size):
+        """ Load stored values for (context, message_id)s in ``language``
+
+        returns a dict of (context, message_id) -> value
+        """
+        model = self.model
+        session = self.session
+        dialect = session.get_bind(model).dialect
+
+        stored = {}
+        for chunk in chunked(translatable_pks, chunk_size):
+            query = select([
+                model.context, model.message_id, model.value,
+            ]).where(and_(
+                model.language == language,
+                key_filter(model, chunk, dialect),
+            ))
+            rows = session.execute(self._for_update(query), mapper=model)
+            stored.update(
+                ((context, message_id), value)
+                for context, message_id, value in rows
+            )
+        return stored
 
     def delete_translations(self, translatable, commit=True):
         """ delete _all_ translations for this (context, message_id) """
+        if self.write_behind is not None:
+            self.write_behind.delete([translatable])
+            return
+
+        if self.summary_model is not None:
+            self._summarise_deletes(
+                [(translatable.context, translatable.message_id)])
+        if self.suggestion_model is not None:
+            self._index_deletes(
+                [(translatable.context, translatable.message_id)],
+                self.chunk_size)
+
         self.session.query(self.model).filter_by(
             context=translatable.context,
             message_id=translatable.message_id,
         ).delete()
 
-        if commit:
-            self.session.commit()
+        keys = [(translatable.context, translatable.message_id, None)]
+        self._commit_and_invalidate(keys, commit)
 
     def move_translations(
             self, old_translatable, new_translatable, commit=True):
+        if self.write_behind is not None:
+            # moves need queued writes to have landed
+            self.write_behind.flush()
+
+        if self.summary_model is not None:
+            self._summarise_moves({
+                (old_translatable.context, old_translatable.message_id): (
+                    new_translatable.context, new_translatable.message_id),
+            })
+        if self.suggestion_model is not None:
+            self._index_moves({
+                (old_translatable.context, old_translatable.message_id): (
+                    new_translatable.context, new_translatable.message_id),
+            }, self.chunk_size)
+
         self.session.query(self.model).filter_by(
             context=old_translatable.context,
             message_id=old_translatable.message_id,
@@ -162,8 +488,514 @@ class Translator(object):
             'message_id': new_translatable.message_id,
         })
 
+        keys = [
+            (old_translatable.context, old_translatable.message_id, None),
+            (new_translatable.context, new_translatable.message_id, None),
+        ]
+        self._commit_and_invalidate(keys, commit)
+
+    def delete_translations_many(
+            self, translatables, chunk_size=None, commit=True):
+        """ delete _all_ translations for many (context, message_id)s
+
+        Uses one DELETE per ``chunk_size`` translatables
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        model = self.model
+        session = self.session
+        dialect = session.get_bind(model).dialect
+
+        pks = set(
+            (translatable.context, translatable.message_id)
+            for translatable in translatables
+        )
+
+        if self.write_behind is not None:
+            self.write_behind.delete([
+                TranslatableString(context, message_id)
+                for context, message_id in pks
+            ])
+            return
+
+        if self.summary_model is not None:
+            self._summarise_deletes(pks, chunk_size)
+        if self.suggestion_model is not None:
+            self._index_deletes(pks, chunk_size)
+
+        for chunk in chunked(pks, chunk_size):
+            delete = model.__table__.delete().where(
+                key_filter(model, chunk, dialect))
+            session.execute(delete, mapper=model)
+
+        keys = [(context, message_id, None) for context, message_id in pks]
+        self._commit_and_invalidate(keys, commit)
+
+    def move_translations_many(self, moves, chunk_size=None, commit=True):
+        """ move translations for many (context, message_id)s
+
+        ``moves`` is an iterable of (old_translatable, new_translatable)
+        pairs. Moves between the same pair of contexts are made together,
+        one UPDATE per ``chunk_size`` moves (mapping message ids with a
+        ``CASE``)
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        if self.write_behind is not None:
+            # moves need queued writes to have landed
+            self.write_behind.flush()
+
+        model = self.model
+        table = model.__table__
+        session = self.session
+
+        # (old_context, new_context) -> {old_message_id: new_message_id}
+        moves_by_context = OrderedDict()
+        keys = []
+        for old_translatable, new_translatable in moves:
+            contexts = (old_translatable.context, new_translatable.context)
+            moves_by_context.setdefault(contexts, OrderedDict())[
+                old_translatable.message_id] = new_translatable.message_id
+            keys.append(
+                (old_translatable.context, old_translatable.message_id, None))
+            keys.append(
+                (new_translatable.context, new_translatable.message_id, None))
+
+        if (self.summary_model is not None or
+                self.suggestion_model is not None):
+            moved_keys = dict(
+                ((old_context, old_message_id), (new_context, new_message_id))
+                for (old_context, new_context), message_ids
+                in moves_by_context.iteritems()
+                for old_message_id, new_message_id in message_ids.iteritems()
+            )
+        if self.summary_model is not None:
+            self._summarise_moves(moved_keys, chunk_size)
+        if self.suggestion_model is not None:
+            self._index_moves(moved_keys, chunk_size)
+
+        for (old_context, new_context), message_ids in (
+                moves_by_context.iteritems()):
+            for chunk in chunked(message_ids.iteritems(), chunk_size):
+                values = {table.c.context: new_context}
+                if any(old != new for old, new in chunk):
+                    # MySQL applies assignments left to right, so this
+                    # mustn't depend on columns already assigned to
+                    values[table.c.message_id] = case(
+                        chunk, value=table.c.message_id,
+                        else_=table.c.message_id)
+
+                update = table.update().where(and_(
+                    table.c.context == old_context,
+                    table.c.message_id.in_([old for old, _ in chunk]),
+                )).values(values)
+                session.execute(update, mapper=model)
+
+        self._commit_and_invalidate(keys, commit)
+
+    def _existing_keys(self, translatable_pks, chunk_size):
+        """ The (context, message_id)s of ``translatable_pks`` with
+        translations in any language
+        """
+        model = self.model
+        session = self.session
+        dialect = session.get_bind(model).dialect
+
+        existing = set()
+        for chunk in chunked(translatable_pks, chunk_size):
+            # not DISTINCT, which can't be combined with FOR UPDATE
+            query = select([model.context, model.message_id]).where(
+                key_filter(model, chunk, dialect))
+            existing.update(
+                (context, message_id)
+                for context, message_id in session.execute(
+                    self._for_update(query), mapper=model)
+            )
+        return existing
+
+    def _stored_rows(self, translatable_pks, chunk_size):
+        """ Yield (context, message_id, language, translated) for all stored
+        translations of ``translatable_pks``, where ``translated`` is
+        whether the value is not null
+        """
+        model = self.model
+        session = self.session
+        dialect = session.get_bind(model).dialect
+
+        for chunk in chunked(translatable_pks, chunk_size):
+            query = select([
+                model.context, model.message_id, model.language,
+                model.value != NULL,
+            ]).where(key_filter(model, chunk, dialect))
+            for row in session.execute(self._for_update(query), mapper=model):
+                yield row
+
+    def _for_update(self, query):
+        """ Lock the rows read by ``query`` (until commit) if counts are
+        derived from them
+
+        Concurrent writes to the same (context, message_id)s then wait,
+        rather than computing deltas from the same state
+        """
+        if self.summary_model is None and self.suggestion_model is None:
+            return query
+        return query.with_for_update()
+
+    def _summarise_saves(self, values, stored, language):
+        """ Update summary counts for saving ``values`` (a dict of
+        (context, message_id) -> value), given the ``stored`` values
+        """
+        existing = self._existing_keys(
+            [key for key in values if key not in stored], self.chunk_size)
+
+        deltas = defaultdict(int)
+        for key, value in values.iteritems():
+            context = key[0]
+            if key in stored:
+                was_translated = stored[key] is not None
+            else:
+                was_translated = False
+                if key not in existing:
+                    deltas[(context, SUMMARY_TOTAL)] += 1
+            deltas[(context, language)] += (
+                (value is not None) - was_translated)
+        self._update_summary(deltas)
+
+    def _summarise_deletes(self, translatable_pks, chunk_size=None):
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        deltas = defaultdict(int)
+        deleted = set()
+        for context, message_id, language, translated in self._stored_rows(
+                translatable_pks, chunk_size):
+            deleted.add((context, message_id))
+            if translated:
+                deltas[(context, language)] -= 1
+        for context, message_id in deleted:
+            deltas[(context, SUMMARY_TOTAL)] -= 1
+        self._update_summary(deltas)
+
+    def _summarise_moves(self, moves, chunk_size=None):
+        """ Update summary counts for ``moves``, a dict of
+        old (context, message_id) -> new (context, message_id)
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        existing = self._existing_keys(moves.values(), chunk_size)
+
+        deltas = defaultdict(int)
+        moved = set()
+        for context, message_id, language, translated in self._stored_rows(
+                moves, chunk_size):
+            new_context, new_message_id = moves[(context, message_id)]
+            moved.add((context, message_id))
+            if translated:
+                deltas[(context, language)] -= 1
+                deltas[(new_context, language)] += 1
+        for key in moved:
+            new_key = moves[key]
+            if new_key == key:
+                continue
+            deltas[(key[0], SUMMARY_TOTAL)] -= 1
+            if new_key not in existing:
+                deltas[(new_key[0], SUMMARY_TOTAL)] += 1
+        self._update_summary(deltas)
+
+    def _update_summary(self, deltas):
+        """ Apply ``deltas``, a dict of (context, language) -> change, to
+        the summary counts
+        """
+        summary = self.summary_model
+        self._increment_counts(summary, [
+            {'context': context, 'language': language, 'count': delta}
+            for (context, language), delta in deltas.iteritems()
+            if delta
+        ])
+
+        # drop rows no longer counting anything, so contexts without
+        # translations are left out of ``coverage``
+        decremented = set(
+            context for (context, _), delta in deltas.iteritems() if delta < 0)
+        for chunk in chunked(decremented, self.chunk_size):
+            delete = summary.__table__.delete().where(and_(
+                summary.context.in_(chunk),
+                summary.count <= 0,
+            ))
+            self.session.execute(delete, mapper=summary)
+
+    def _increment_counts(self, model, rows):
+        """ Add the ``count`` of each of ``rows`` to the matching row of
+        ``model`` (by primary key), inserting rows that don't exist
+        """
+        table = model.__table__
+        session = self.session
+        dialect = session.get_bind(model).dialect
+
+        if dialect.name in UPSERT_DIALECTS:
+            for chunk in chunked(rows, self.chunk_size):
+                upsert = Upsert(table, chunk, ['count'], increment=True)
+                session.execute(upsert, mapper=model)
+            return
+
+        for row in rows:
+            update = table.update().where(and_(*(
+                column == row[column.name] for column in table.primary_key
+            ))).values(count=table.c.count + row['count'])
+            if session.execute(update, mapper=model).rowcount == 0:
+                session.execute(table.insert().values(row), mapper=model)
+
+    def rebuild_summary(self, commit=True):
+        """ Recount the summary table (see ``summary_model``) from scratch,
+        e.g. to populate it initially
+        """
+        model = self.model
+        summary = self.summary_model
+        table = summary.__table__
+        session = self.session
+
+        translated = select([
+            model.context, model.language, func.count(),
+        ]).where(
+            model.value != NULL
+        ).group_by(model.context, model.language)
+        totals = select([
+            model.context, literal(SUMMARY_TOTAL),
+            func.count(distinct(model.message_id)),
+        ]).group_by(model.context)
+
+        session.execute(table.delete(), mapper=summary)
+        for query in (translated, totals):
+            insert = table.insert().from_select(
+                ['context', 'language', 'count'], query)
+            session.execute(insert, mapper=summary)
+
+        if commit:
+            session.commit()
+
+    def coverage(self, languages, group_by='context', use_summary=True):
+        """ Count translations into ``languages``, per context
+
+        returns a dict of {context: Coverage(total, translated)}, where
+        ``total`` is the number of message ids (with translations in any
+        language), and ``translated`` a dict of {language: number of
+        translations}. With ``group_by=None``, counts are for all contexts
+        together, keyed by ``None``.
+
+        Counts are read from the summary table if the translator has a
+        ``summary_model`` (and ``use_summary`` is set), and otherwise
+        counted from the translations table
+        """
+        if group_by not in ('context', None):
+            raise ValueError("Unknown group_by '{}'".format(group_by))
+
+        if self.summary_model is not None and use_summary:
+            counts = self._summary_counts(languages)
+        else:
+            counts = self._translation_counts(languages)
+
+        coverage = {}
+        for context, total, translated in counts:
+            if group_by is None:
+                context = None
+            if context not in coverage:
+                coverage[context] = Coverage(
+                    0, dict((language, 0) for language in languages))
+            totals = coverage[context]
+            for language, count in translated.iteritems():
+                totals.translated[language] += count
+            coverage[context] = totals._replace(total=totals.total + total)
+        return coverage
+
+    def _translation_counts(self, languages):
+        """ Yield (context, total, {language: count}) from the translations
+        table
+        """
+        model = self.model
+        query = select([
+            model.context, func.count(distinct(model.message_id)),
+        ] + [
+            func.count(case([
+                (and_(model.language == language, model.value != NULL), 1),
+            ]))
+            for language in languages
+        ]).group_by(model.context)
+
+        for row in self.read_session.execute(query, mapper=model):
+            context, total = row[:2]
+            yield context, total, dict(zip(languages, row[2:]))
+
+    def _summary_counts(self, languages):
+        """ Yield (context, total, {language: count}) from the summary
+        table
+        """
+        summary = self.summary_model
+        query = select([
+            summary.context, summary.language, summary.count,
+        ]).where(summary.language.in_(list(languages) + [SUMMARY_TOTAL]))
+
+        counts = defaultdict(dict)
+        for context, language, count in self.read_session.execute(
+                query, mapper=summary):
+            counts[context][language] = count
+        for context, translated in counts.iteritems():
+            total = translated.pop(SUMMARY_TOTAL, 0)
+            yield context, total, translated
+
+    def _stored_translations(self, translatable_pks, chunk_size):
+        """ Load all stored (non-null) values for (context, message_id)s
+
+        returns a dict of (context, message_id) -> {language: value}, with
+        an entry for each of ``translatable_pks``
+        """
+        model = self.model
+        session = self.session
+        dialect = session.get_bind(model).dialect
+
+        stored = dict((key, {}) for key in translatable_pks)
+        for chunk in chunked(stored, chunk_size):
+            query = select([
+                model.context, model.message_id, model.language, model.value,
+            ]).where(and_(
+                model.value != NULL,
+                key_filter(model, chunk, dialect),
+            ))
+            for context, message_id, language, value in session.execute(
+                    self._for_update(query), mapper=model):
+                stored[(context, message_id)][language] = value
+        return stored
+
+    def _index_saves(self, values, language, chunk_size):
+        """ Update the suggestion index for saving ``values`` (a dict of
+        (context, message_id) -> value) in ``language``
+        """
+        before = self._stored_translations(values, chunk_size)
+        after = {}
+        for key, value in values.iteritems():
+            after[key] = dict(before[key])
+            if value is None:
+                after[key].pop(language, None)
+            else:
+                after[key][language] = value
+        self._update_suggestion_index(before, after)
+
+    def _index_deletes(self, translatable_pks, chunk_size):
+        before = self._stored_translations(translatable_pks, chunk_size)
+        after = dict((key, {}) for key in before)
+        self._update_suggestion_index(before, after)
+
+    def _index_moves(self, moves, chunk_size):
+        """ Update the suggestion index for ``moves``, a dict of
+        old (context, message_id) -> new (context, message_id)
+        """
+        before = self._stored_translations(
+            set(moves) | set(moves.values()), chunk_size)
+        after = dict((key, dict(values)) for key, values in before.iteritems())
+        for old_key in moves:
+            after[old_key] = {}
+        for old_key, new_key in moves.iteritems():
+            after[new_key].update(before[old_key])
+        self._update_suggestion_index(before, after)
+
+    def _update_suggestion_index(self, before, after):
+        """ Update the suggestion index for translations changing from
+        ``before`` to ``after`` (dicts of
+        (context, message_id) -> {language: value})
+        """
+        rows = {}
+        for translations, change in ((before, -1), (after, 1)):
+            for row in suggestion_index_rows(translations):
+                key = tuple(
+                    row[column.name]
+                    for column in self.suggestion_model.__table__.primary_key
+                )
+                if key in rows:
+                    rows[key]['count'] += change
+                else:
+                    row['count'] = change
+                    rows[key] = row
+
+        rows = [row for row in rows.itervalues() if row['count']]
+        self._increment_counts(self.suggestion_model, rows)
+
+        # drop rows no longer counting any message ids, so the index
+        # doesn't keep growing as translations change
+        decremented = [row for row in rows if row['count'] < 0]
+        index = self.suggestion_model
+        for chunk in chunked(decremented, self.chunk_size):
+            delete = index.__table__.delete().where(and_(
+                index.context.in_(set(row['context'] for row in chunk)),
+                index.value_hash.in_(set(row['value_hash'] for row in chunk)),
+                index.count <= 0,
+            ))
+            self.session.execute(delete, mapper=index)
+
+    def rebuild_suggestion_index(self, chunk_size=None, commit=True):
+        """ Rebuild the suggestion index (see ``suggestion_model``) from
+        scratch, e.g. to populate it initially
+
+        Translations are read ``chunk_size`` (context, message_id)s at a
+        time, in primary key order
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        model = self.model
+        index = self.suggestion_model
+        session = self.session
+
+        session.execute(index.__table__.delete(), mapper=index)
+
+        after = None
+        while True:
+            query = select([model.context, model.message_id]).where(
+                model.value != NULL
+            ).distinct().order_by(
+                model.context, model.message_id
+            ).limit(chunk_size)
+            if after is not None:
+                query = query.where(keyset_filter(model, after))
+            pks = [tuple(row) for row in session.execute(query, mapper=model)]
+            if not pks:
+                break
+
+            translations = self._stored_translations(pks, chunk_size)
+            self._update_suggestion_index({}, translations)
+            after = pks[-1]
+
+        if commit:
+            session.commit()
+
+    def _commit_and_invalidate(self, keys, commit):
+        """ Commit (optionally) and invalidate ``keys`` in the shared cache
+
+        ``keys`` are (context, message_id, language) tuples, where a
+        language of ``None`` invalidates all languages. Keys are invalidated
+        both before and after committing, so that lookups running
+        concurrently with the commit can't repopulate stale values.
+        """
+        self.invalidate(keys)
+
         if commit:
             self.session.commit()
+            self.invalidate(keys)
+
+    def invalidate(self, keys):
+        """ Invalidate ``keys`` in the shared cache, e.g. after writing
+        translations with another session
+
+        ``keys`` are (context, message_id, language) tuples, where a
+        language of ``None`` invalidates all languages
+        """
+        shared_cache = self.shared_cache
+        if shared_cache is None:
+            return
+
+        for context, message_id, language in keys:
+            shared_cache.invalidate(context, message_id, language)
 
     def _normalised_translations(self, languages, base_query=None):
         """ helper for bulk operations
@@ -188,7 +1020,7 @@ class Translator(object):
             query.filter(aliases[0].value == NULL)
 
         """
-        session = self.session
+        session = self.read_session
         model = self.model
 
         if base_query is None:
@@ -216,23 +1048,138 @@ class Translator(object):
 
         return query, aliases, columns
 
-    def list_translations(self, languages):
+    def list_translations(
+            self, languages, context_prefix=None, source_languages=None,
+            after=None, limit=None, yield_per=None, pivot=False):
         """ list all translations for the requested languages
 
         return a tuple (context, message_id, value1, value2, ...)
 
         where value_n is the translation for the nth language in the
         ``languages`` list
+
+        Rows may be restricted to contexts starting with ``context_prefix``,
+        and to (context, message_id)s translated into any of
+        ``source_languages``.
+
+        For keyset pagination, pass ``limit``, and for subsequent pages
+        ``after``, the (context, message_id) of the last row of the
+        previous page. Rows are then ordered by (context, message_id).
+
+        With ``yield_per``, rows are streamed (using a server side cursor
+        where the db driver supports it), ``yield_per`` at a time, rather
+        than loaded all at once.
+
+        By default, the translations table is joined once per language.
+        With ``pivot``, rows are built from a single scan of the table
+        instead (see ``_pivoted_translations``), which is cheaper for
+        many languages.
         """
-        query, _, columns = self._normalised_translations(languages)
-        return query.values(*columns)
+        return self._list_translations(
+            languages, False, context_prefix, source_languages, after, limit,
+            yield_per, pivot)
 
-    def list_missing_translations(self, languages):
+    def list_missing_translations(
+            self, languages, context_prefix=None, source_languages=None,
+            after=None, limit=None, yield_per=None, pivot=False):
         """ as ``list_translations`` but restricted to rows where a translation
         is missing for at least one of the requested languages
         """
-        query, aliases, columns = self._normalised_translations(languages)
-        query = query.filter(or_(*(alias.value == NULL for alias in aliases)))
+        return self._list_translations(
+            languages, True, context_prefix, source_languages, after, limit,
+            yield_per, pivot)
+
+    def _pivoted_translations(self, languages, base_query=None):
+        """ as ``_normalised_translations``, but pivoting with conditional
+        aggregation instead of joining once per language
+
+        returns query, values, columns
+
+        ``query`` groups translations by (context, message_id), selecting
+        ``MAX(CASE WHEN language = ... THEN value END)`` for each language.
+        Without a ``base_query``, this is a single scan of the translations
+        table. Otherwise the base query is joined (once) to the
+        translations table.
+
+        ``values`` are the aggregate expressions for each language, so that
+        we can apply filters, e.g.
+            query.having(values[0] == NULL)
+        """
+        session = self.read_session
+        model = self.model
+
+        values = [
+            func.max(case([(model.language == language, model.value)]))
+            for language in languages
+        ]
+
+        if base_query is None:
+            key_columns = [model.context, model.message_id]
+            query = session.query(*key_columns + values)
+        else:
+            subquery = base_query.subquery(name='basequery')
+            key_columns = [subquery.c.context, subquery.c.message_id]
+            query = session.query(*key_columns + values).outerjoin(
+                model,
+                and_(
+                    model.context == subquery.c.context,
+                    model.message_id == subquery.c.message_id,
+                    model.language.in_(languages),
+                )
+            )
+
+        query = query.group_by(*key_columns)
+        columns = key_columns + values
+        return query, values, columns
+
+    def _list_translations(
+            self, languages, missing, context_prefix, source_languages,
+            after, limit, yield_per, pivot):
+        model = self.model
+
+        # these filters are on a prefix of the primary key, and only need
+        # an index range scan
+        key_filters = []
+        if context_prefix is not None:
+            key_filters.append(prefix_filter(model.context, context_prefix))
+        if after is not None:
+            key_filters.append(keyset_filter(model, after))
+
+        if pivot:
+            query, values, columns = self._pivoted_translations(languages)
+            query = query.filter(*key_filters)
+            if source_languages is not None:
+                query = query.having(func.max(case([
+                    (model.language.in_(source_languages), 1)
+                ])) == 1)
+            if missing:
+                query = query.having(
+                    or_(*(value == NULL for value in values)))
+        else:
+            base_query = self.read_session.query(
+                model.context, model.message_id).distinct()
+            base_query = base_query.filter(*key_filters)
+            if source_languages is not None:
+                base_query = base_query.filter(
+                    model.language.in_(source_languages))
+            if limit is not None and not missing:
+                # one row per (context, message_id), so we can limit early
+                base_query = base_query.order_by(
+                    model.context, model.message_id).limit(limit)
+
+            query, aliases, columns = self._normalised_translations(
+                languages, base_query)
+            if missing:
+                query = query.filter(
+                    or_(*(alias.value == NULL for alias in aliases)))
+
+        if after is not None or limit is not None:
+            query = query.order_by(*columns[:2])
+        if limit is not None:
+            query = query.limit(limit)
+        if yield_per is not None:
+            query = query.execution_options(
+                stream_results=True).yield_per(yield_per)
         return query.values(*columns)
 
     def suggest_translation(self, translatable, from_language, to_language):
@@ -261,41 +1208,175 @@ class Translator(object):
         returns 'Valeur'
 
         If multiple suggestions are possible, the most frequently occuring one
-        is returned
+        is returned (the lowest value, for ties)
         """
-        session = self.session
+        key = (translatable.context, translatable.message_id)
+        return self.suggest_translations(
+            [translatable], from_language, to_language)[key]
+
+    def suggest_translations(
+            self, translatables, from_language, to_language, chunk_size=None,
+            use_index=True):
+        """ As ``suggest_translation``, for many translatables at once
+
+        returns a dict of {(context, message_id): suggestion}, with ``None``
+        where there's no suggestion. Suggestions are found with a single
+        (grouped) query per ``chunk_size`` translatables, or looked up in
+        the suggestion index if the translator has a ``suggestion_model``
+        (and ``use_index`` is set)
+        """
+        try:
+            return self._suggest_translations(
+                translatables, from_language, to_language, chunk_size,
+                use_index)
+        finally:
+            self._end_read()
+
+    def _suggest_translations(
+            self, translatables, from_language, to_language, chunk_size,
+            use_index):
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        session = self.read_session
         model = self.model
+        dialect = session.get_bind(model).dialect
 
-        from_value = session.query(model.value).filter(
-            model.context == translatable.context,
-            model.message_id == translatable.message_id,
-            model.language == from_language,
-        ).scalar()
-
-        if from_value is None:
-            return None
-
+        pks = OrderedDict(
+            ((translatable.context, translatable.message_id), None)
+            for translatable in translatables
+        )
+        lookup_pks = [
+            (context, message_id) for context, message_id in pks
+            if message_id is not None
+        ]
+
+        if self.suggestion_model is not None and use_index:
+            for chunk in chunked(lookup_pks, chunk_size):
+                pks.update(self._indexed_suggestions(
+                    chunk, from_language, to_language))
+            return dict(pks)
+
+        # the source value of each translatable, other message ids with the
+        # same source value (in the same context) and their translations
+        source_alias = aliased(model, name="source")
         from_alias = aliased(model, name="from_language")
         to_alias = aliased(model, name="to_language")
-        query = session.query(to_alias.value).outerjoin(
-            from_alias,
-            and_(
-                from_alias.context == to_alias.context,
-                from_alias.message_id == to_alias.message_id,
+        for chunk in chunked(lookup_pks, chunk_size):
+            query = session.query(
+                source_alias.context, source_alias.message_id, to_alias.value,
+            ).join(
+                from_alias,
+                and_(
+                    from_alias.context == source_alias.context,
+                    from_alias.language == from_language,
+                    from_alias.value == source_alias.value,
+                )
+            ).join(
+                to_alias,
+                and_(
+                    to_alias.context == from_alias.context,
+                    to_alias.message_id == from_alias.message_id,
+                )
+            ).filter(
+                key_filter(source_alias, chunk, dialect),
+                source_alias.language == from_language,
+                to_alias.language == to_language,
+                to_alias.value != NULL,
+            ).group_by(
+                source_alias.context, source_alias.message_id, to_alias.value,
+            ).order_by(
+                desc(func.count()), to_alias.value,
             )
-        ).filter(
-            from_alias.context == translatable.context,
-            from_alias.language == from_language,
-            from_alias.value == from_value,
-            to_alias.language == to_language,
-            to_alias.value != NULL,
-        ).group_by(
-            to_alias.value
-        ).order_by(
-            desc(func.count())
+
+            for context, message_id, value in query:
+                # rows are ordered by frequency; keep the first per key
+                if pks[(context, message_id)] is None:
+                    pks[(context, message_id)] = value
+
+        return dict(pks)
+
+    def _indexed_suggestions(self, translatable_pks, from_language,
+                             to_language):
+        """ Look suggestions for ``translatable_pks`` up in the suggestion
+        index
+
+        returns a dict of {(context, message_id): suggestion}, for
+        translatables with suggestions
+        """
+        session = self.read_session
+        model = self.model
+        index = self.suggestion_model
+        dialect = session.get_bind(model).dialect
+
+        query = select([
+            model.context, model.message_id, model.value,
+        ]).where(and_(
+            model.language == from_language,
+            model.value != NULL,
+            key_filter(model, translatable_pks, dialect),
+        ))
+        hashes = defaultdict(list)  # (context, value_hash) -> [pk, ...]
+        for context, message_id, value in session.execute(
+                query, mapper=model):
+            hashes[(context, value_hash(value))].append((context, message_id))
+        if not hashes:
+            return {}
+
+        # both columns are filtered separately; other combinations are
+        # ignored below
+        query = select([
+            index.context, index.value_hash, index.to_value,
+        ]).where(and_(
+            index.context.in_(set(context for context, _ in hashes)),
+            index.from_language == from_language,
+            index.value_hash.in_(set(hash_ for _, hash_ in hashes)),
+            index.to_language == to_language,
+            index.count > 0,
+        )).order_by(
+            desc(index.count), index.to_value,
         )
 
-        return query.limit(1).scalar()
+        suggestions = {}
+        for context, hash_, to_value in session.execute(query, mapper=index):
+            for key in hashes.pop((context, hash_), []):
+                # rows are ordered by frequency; the first per key is kept
+                suggestions[key] = to_value
+        return suggestions
+
+
+def suggestion_index_rows(translations):
+    """ Rows of a suggestion index (without counts) for ``translations``, a
+    dict of (context, message_id) -> {language: value}
+    """
+    for (context, _), values in translations.iteritems():
+        for from_language, from_value in values.iteritems():
+            for to_language, to_value in values.iteritems():
+                if from_language == to_language:
+                    continue
+                yield {
+                    'context': context,
+                    'from_language': from_language,
+                    'value_hash': value_hash(from_value),
+                    'to_language': to_language,
+                    'to_value_hash': value_hash(to_value),
+                    'to_value': to_value,
+                }
+
+
+def get_session_registry(session):
+    """ Callable returning the session to use, and whether the translator
+    owns the sessions it returns
+
+    Given a ``sessionmaker``, each thread gets its own session, owned by the
+    translator. A ``scoped_session`` (or other callable) is called for each
+    use, and a ``Session`` is always used as is.
+    """
+    if isinstance(session, sessionmaker):
+        return scoped_session(session), True
+    if isinstance(session, Session) or not callable(session):
+        return (lambda: session), False
+    return session, False
 
 
 class TranslationContextManager(object):
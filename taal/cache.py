@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+
+import sys
+import time
+from collections import OrderedDict
+from threading import RLock
+
+
+class TranslationCache(object):
+    """
+    Process-wide cache of translations, shared between translators
+
+    Keys are ``(context, message_id, language)`` tuples. A value of
+    ``None`` records that no translation exists, so known misses don't
+    hit the database either.
+
+    The cache may be bounded by number of entries (``max_entries``) and/or
+    (approximate) memory use in bytes (``max_size``), evicting the least
+    recently used entries first. Entries older than ``ttl`` seconds are
+    discarded on access.
+
+    Usage:
+        cache = TranslationCache(max_entries=100000, ttl=3600)
+        translator = Translator(
+            Translation, session, 'en', shared_cache=cache)
+
+    Writes through a ``Translator`` invalidate affected entries. Writes
+    from other processes are only picked up once entries expire.
+
+    A cache may also be scoped to a single (e.g. web) request, by passing
+    a new instance to every ``Translator.translate`` call made during the
+    request:
+
+        cache = TranslationCache()
+        translator.translate(data, cache=cache)
+        translator.translate(other_data, cache=cache)
+
+    Subsequent calls only query for translations not yet seen. Note that
+    writes are not reflected in such request caches.
+
+    Lookups are counted in ``hits``, ``misses`` (per
+    ``(context, message_id, language)``) and ``queries`` (db queries issued
+    to load misses).
+    """
+
+    def __init__(self, max_entries=None, max_size=None, ttl=None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.size = 0
+        # incremented on every invalidation; see ``update``
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+
+        self._entries = OrderedDict()  # key -> (value, expires, size)
+        self._languages = {}  # (context, message_id) -> set of languages
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __getitem__(self, key):
+        with self._lock:
+            value, expires, size = self._entries[key]
+            if expires is not None and expires <= time.time():
+                self._discard(key)
+                raise KeyError(key)
+
+            # mark as most recently used
+            del self._entries[key]
+            self._entries[key] = (value, expires, size)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._discard(key)
+
+            if self.ttl is None:
+                expires = None
+            else:
+                expires = time.time() + self.ttl
+            size = sum(sys.getsizeof(item) for item in key + (value,))
+
+            self._entries[key] = (value, expires, size)
+            context, message_id, language = key
+            self._languages.setdefault(
+                (context, message_id), set()).add(language)
+            self.size += size
+
+            self._evict()
+
+    def get_many(self, keys):
+        """ Look up ``keys``, returning a dict of those found in the cache
+
+        Counts hits and misses
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                try:
+                    found[key] = self[key]
+                except KeyError:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return found
+
+    def update(self, items, generation=None, queries=0):
+        """ Add ``(key, value)`` pairs to the cache
+
+        If ``generation`` is given and the cache has since been invalidated,
+        the values may be stale and are dropped. ``queries`` is added to the
+        count of queries issued to load them.
+        """
+        with self._lock:
+            self.queries += queries
+            if generation is not None and generation != self.generation:
+                return
+            for key, value in items:
+                self[key] = value
+
+    def invalidate(self, context, message_id, language=None):
+        """ Drop cached translations for (context, message_id)
+
+        Drops all languages unless ``language`` is given
+        """
+        with self._lock:
+            self.generation += 1
+
+            languages = self._languages.get((context, message_id), ())
+            if language is not None:
+                languages = [lang for lang in languages if lang == language]
+            for lang in list(languages):
+                self._discard((context, message_id, lang))
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._languages.clear()
+            self.size = 0
+
+    def _discard(self, key):
+        try:
+            _, _, size = self._entries.pop(key)
+        except KeyError:
+            return
+
+        self.size -= size
+        context, message_id, language = key
+        languages = self._languages[(context, message_id)]
+        languages.discard(language)
+        if not languages:
+            del self._languages[(context, message_id)]
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries is not None and
+                len(self._entries) > self.max_entries) or
+            (self.max_size is not None and self.size > self.max_size)
+        ):
+            oldest_key = next(iter(self._entries))
+            self._discard(oldest_key)
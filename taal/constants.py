@@ -5,6 +5,14 @@ PLACEHOLDER = "taal:placeholder"
 # transparent values are passed through taal without being translated
 TRANSPARENT_VALUES = (None,)
 
+# value of translations being deleted, in ``WriteBehindQueue.overlay``
+# (distinct from ``None``, a value saved as NULL)
+DELETED = object()
+
+# language of translation summary rows counting (context, message_id)s
+# translated into any language
+SUMMARY_TOTAL = "*"
+
 
 class PlaceholderValue(object):
     """ Represents a translated value that has not been transformed.
@@ -4,3 +4,7 @@ class NoTranslatorRegistered(Exception):
 
 class BindError(Exception):
     """ Binding to an unrecognized target """
+
+
+class QueueFull(Exception):
+    """ Timed out waiting for space in a write-behind queue """
@@ -1,4 +1,7 @@
 import copy
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
 from weakref import WeakKeyDictionary
 
 from kaiso.exceptions import DeserialisationError
@@ -15,6 +18,8 @@ from taal.translatablestring import (
 )
 
 
+log = logging.getLogger(__name__)
+
 MISSING = object()
 translator_registry = WeakKeyDictionary()
 
@@ -74,8 +79,49 @@ def collect_translatables(manager, obj):
     return translatables
 
 
+class TranslationBatch(object):
+    """ Translation writes deferred by ``Manager.batch_translations`` """
+
+    def __init__(self, translator):
+        self.translator = translator
+        self.to_save = OrderedDict()
+        self.to_delete = OrderedDict()
+
+    def add(self, to_save, to_delete):
+        # with the same outcome as writing in order: deletions remove all
+        # translations for a (context, message_id), then the last value
+        # collected is saved
+        for translatable in to_delete:
+            key = (translatable.context, translatable.message_id)
+            self.to_save.pop(key, None)
+            self.to_delete[key] = translatable
+        for translatable in to_save:
+            key = (translatable.context, translatable.message_id)
+            self.to_save[key] = translatable
+
+    def flush(self):
+        """ Write with one bulk delete and one bulk upsert """
+        translator = self.translator
+        translator.delete_translations_many(
+            self.to_delete.values(), commit=False)
+        translator.save_translations(self.to_save.values())
+        self.to_save.clear()
+        self.to_delete.clear()
+
+
+def _flush_after_error(batch):
+    # a function of its own, so handling a failure here doesn't replace the
+    # exception being handled by the caller (on python 2)
+    try:
+        batch.flush()
+    except Exception:
+        log.exception("Failed to write translations batched before an error")
+
+
 class Manager(KaisoManager):
 
+    _translation_batch = None
+
     def serialize(self, obj, for_db=False):
         if for_db or type(obj) is PersistableType:
             return super(Manager, self).serialize(obj)
@@ -124,19 +170,69 @@ class Manager(KaisoManager):
 
         return obj
 
+    @contextmanager
+    def batch_translations(self):
+        """ Defer translation writes from ``save``, ``delete`` and
+        ``change_instance_type`` to the end of the block
+
+        All are then written with one bulk delete and one bulk upsert (and
+        a single commit). They're also written if the block raises, since
+        the objects saved (or deleted) so far already are, before the
+        block's exception propagates. Failing to write them then is
+        logged, rather than masking that exception.
+
+        Usage:
+            with manager.batch_translations():
+                for obj in objs:
+                    manager.save(obj)
+
+        Nested blocks join the outermost one. A batch belongs to the
+        manager, so the manager mustn't be shared between threads while
+        batching.
+        """
+        if self._translation_batch is not None:
+            yield
+            return
+
+        batch = TranslationBatch(get_translator(self))
+        self._translation_batch = batch
+        try:
+            yield
+        except Exception:
+            self._translation_batch = None
+            _flush_after_error(batch)
+            raise
+        finally:
+            self._translation_batch = None
+        batch.flush()
+
+    def _write_translations(self, to_save, to_delete):
+        batch = self._translation_batch
+        if batch is not None:
+            batch.add(to_save, to_delete)
+            return
+
+        translator = get_translator(self)
+        translator.delete_translations_many(to_delete, commit=False)
+        translator.save_translations(to_save)
+
     def save(self, obj):
         translatables = collect_translatables(self, obj)
         result = super(Manager, self).save(obj)
 
         if translatables:
-            translator = get_translator(self)
-            for translatable in translatables:
-                if is_translatable_value(translatable.pending_value):
-                    translator.save_translation(translatable)
-                else:
-                    # delete all translations (in every language) if the
-                    # value is None or the empty string
-                    translator.delete_translations(translatable)
+            # delete all translations (in every language) if the
+            # value is None or the empty string
+            self._write_translations(
+                to_save=[
+                    translatable for translatable in translatables
+                    if is_translatable_value(translatable.pending_value)
+                ],
+                to_delete=[
+                    translatable for translatable in translatables
+                    if not is_translatable_value(translatable.pending_value)
+                ],
+            )
 
         return result
 
@@ -145,9 +241,7 @@ class Manager(KaisoManager):
         result = super(Manager, self).delete(obj)
 
         if translatables:
-            translator = get_translator(self)
-            for translatable in translatables:
-                translator.delete_translations(translatable)
+            self._write_translations(to_save=[], to_delete=translatables)
 
         return result
 
@@ -227,22 +321,27 @@ class Manager(KaisoManager):
 
         translator = get_translator(self)
 
-        for key in to_delete:
-            translatable = old_translatables[key]
-            translator.delete_translations(translatable)
-
-        for key in to_rename:
-            old_translatable = old_translatables[key]
-            new_translatable = new_translatables[key]
-            translator.move_translations(old_translatable, new_translatable)
-            if new_translatable.pending_value is not None:
-                # updated_values contained a key for a field already existing
-                # on the old type. save the updated translation
-                translator.save_translation(new_translatable)
-
-        for key in to_add:
-            translatable = new_translatables[key]
-            if translatable.pending_value is not None:
-                translator.save_translation(translatable)
+        moves = [
+            (old_translatables[key], new_translatables[key])
+            for key in to_rename
+        ]
+        batch = self._translation_batch
+        if batch is None:
+            translator.move_translations_many(moves, commit=False)
+        elif moves:
+            # moves apply to stored translations, so anything deferred
+            # needs writing first
+            batch.flush()
+            translator.move_translations_many(moves)
+
+        # for renamed keys, updated_values contained a key for a field
+        # already existing on the old type. save the updated translation
+        self._write_translations(
+            to_save=[
+                new_translatables[key] for key in to_rename | to_add
+                if new_translatables[key].pending_value is not None
+            ],
+            to_delete=[old_translatables[key] for key in to_delete],
+        )
 
         return new_obj
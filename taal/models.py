@@ -1,6 +1,6 @@
 from __future__ import absolute_import
 
-from sqlalchemy import Column, String, Text
+from sqlalchemy import Column, Integer, String, Text
 
 
 class TranslationMixin(object):
@@ -13,7 +13,69 @@ class TranslationMixin(object):
                 __tablename__ = "my_translations"
     """
 
-    context = Column(String(255, collation='utf8_bin'), primary_key=True)
-    message_id = Column(String(255, collation='utf8_bin'), primary_key=True)
-    language = Column(String(255, collation='utf8_bin'), primary_key=True)
+    context = Column(
+        String(255, collation='utf8_bin', convert_unicode=True),
+        primary_key=True)
+    message_id = Column(
+        String(255, collation='utf8_bin', convert_unicode=True),
+        primary_key=True)
+    language = Column(
+        String(255, collation='utf8_bin', convert_unicode=True),
+        primary_key=True)
     value = Column(Text(convert_unicode=True))
+
+
+class TranslationSummaryMixin(object):
+    """ Mixin for sqlalchemy model to contain translation counts
+
+        Counts the translations (with a non-null value) for each context and
+        language. Rows with language ``taal.constants.SUMMARY_TOTAL`` count
+        (context, message_id)s with a translation in any language.
+
+        Used by ``Translator.coverage``. Pass the model to the
+        ``Translator`` as ``summary_model`` to keep it up to date.
+
+        Usage:
+            class MyTranslationSummary(TranslationSummaryMixin, Base):
+                __tablename__ = "my_translation_summary"
+    """
+
+    context = Column(
+        String(255, collation='utf8_bin', convert_unicode=True),
+        primary_key=True)
+    language = Column(
+        String(255, collation='utf8_bin', convert_unicode=True),
+        primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class TranslationSuggestionMixin(object):
+    """ Mixin for sqlalchemy model to contain an index of suggestions
+
+        For each context and pair of languages, counts the message ids
+        translated as the value hashed as ``value_hash`` in
+        ``from_language``, and as ``to_value`` in ``to_language``. That's a
+        row per ordered pair of languages a message id is translated into,
+        i.e. O(L^2) rows per message id for L languages.
+
+        Used by ``Translator.suggest_translations``. Pass the model to the
+        ``Translator`` as ``suggestion_model`` to keep it up to date.
+
+        Usage:
+            class MyTranslationSuggestion(TranslationSuggestionMixin, Base):
+                __tablename__ = "my_translation_suggestions"
+    """
+
+    context = Column(
+        String(255, collation='utf8_bin', convert_unicode=True),
+        primary_key=True)
+    from_language = Column(
+        String(255, collation='utf8_bin', convert_unicode=True),
+        primary_key=True)
+    value_hash = Column(String(40), primary_key=True)
+    to_language = Column(
+        String(255, collation='utf8_bin', convert_unicode=True),
+        primary_key=True)
+    to_value_hash = Column(String(40), primary_key=True)
+    to_value = Column(Text(convert_unicode=True), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
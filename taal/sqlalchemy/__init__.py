@@ -1,5 +1,10 @@
 from __future__ import absolute_import
 
+from taal.sqlalchemy.bulk import (
+    TranslatableQuery, bulk_insert_mappings, bulk_update)
 from taal.sqlalchemy.types import TranslatableString, make_from_obj
 
-__all__ = ['TranslatableString', 'make_from_obj']
+__all__ = [
+    'TranslatableQuery', 'TranslatableString', 'bulk_insert_mappings',
+    'bulk_update', 'make_from_obj',
+]
@@ -0,0 +1,178 @@
+import itertools
+from collections import OrderedDict
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Query, configure_mappers
+
+from taal.sqlalchemy.events import bulk_updating_sessions, get_flush_log
+from taal.sqlalchemy.types import (
+    get_context, get_message_id_from_primary_key, pending_translatables,
+    translatable_models)
+from taal.translatablestring import (
+    is_translatable_value,
+    TranslatableString as TaalTranslatableString,
+)
+
+
+def bulk_insert_mappings(session, mapper, mappings):
+    """ Insert rows from a list of dicts, without creating instances
+
+    ``mappings`` are keyed by attribute name, as for
+    ``Session.bulk_insert_mappings``, with plain strings for translatable
+    columns. The placeholder is written to the model table, and the
+    translations are saved in bulk (with other pending translations)
+    when the session commits.
+
+    Rows are inserted with one (executemany) statement per distinct set of
+    keys; rows with a primary key value first, so generated keys can't
+    collide with them. Where rows without a primary key value have
+    translations, their generated keys are needed for the message ids.
+    They're fetched with ``RETURNING`` where the dialect supports it, and
+    otherwise by inserting those rows one by one.
+    """
+    # translatable columns are registered once mappers are configured
+    configure_mappers()
+    mapper = inspect(mapper)
+    cls = mapper.class_
+    table = mapper.local_table
+    translatable_columns = translatable_models.get(cls, {})
+    dialect = session.get_bind(mapper).dialect
+
+    log = get_flush_log(session)
+    batches = OrderedDict()
+    generated_batches = OrderedDict()
+    returning_batches = OrderedDict()
+    for mapping in mappings:
+        row = {}
+        translatables = []
+        for attr_name, value in mapping.items():
+            column = mapper.get_property(attr_name).columns[0]
+            if column in translatable_columns and is_translatable_value(value):
+                translatable = TaalTranslatableString(
+                    context=get_context(cls, column.name),
+                    pending_value=value,
+                )
+                # written to the db as a placeholder
+                pending_translatables.add(translatable)
+                translatables.append((column, translatable))
+                value = translatable
+            row[column.key] = value
+
+        primary_key = [row.get(column.key) for column in mapper.primary_key]
+        if all(key is not None for key in primary_key):
+            batches.setdefault(frozenset(row), []).append(row)
+            _log_translatables(session, log, primary_key, translatables)
+        elif not translatables:
+            generated_batches.setdefault(frozenset(row), []).append(row)
+        else:
+            returning_batches.setdefault(frozenset(row), []).append(
+                (row, translatables))
+
+    for rows in itertools.chain(batches.values(), generated_batches.values()):
+        session.execute(table.insert(), rows, mapper=mapper)
+
+    for rows in returning_batches.values():
+        if _supports_returning(dialect):
+            insert = table.insert().values(
+                [row for row, _ in rows]
+            ).returning(*mapper.primary_key)
+            # rows are returned in the order of the VALUES list
+            primary_keys = session.execute(insert, mapper=mapper).fetchall()
+        else:
+            primary_keys = [
+                session.execute(
+                    table.insert(), row, mapper=mapper).inserted_primary_key
+                for row, _ in rows
+            ]
+        for (_, translatables), primary_key in zip(rows, primary_keys):
+            _log_translatables(session, log, primary_key, translatables)
+
+
+def _supports_returning(dialect):
+    """ Whether ``dialect`` can return generated keys from a multi-row
+    ``INSERT``
+    """
+    return bool(
+        dialect.implicit_returning and dialect.supports_multivalues_insert)
+
+
+def _log_translatables(session, log, primary_key, translatables):
+    message_id = get_message_id_from_primary_key(primary_key)
+    for column, translatable in translatables:
+        translatable.message_id = message_id
+        log.add(session.transaction, None, column, translatable)
+
+
+def bulk_update(query, values, synchronize_session='evaluate'):
+    """ As ``query.update(values)``, but supporting translatable columns
+
+    The primary keys of affected rows are fetched (with a single query)
+    before updating. Translations are then saved (or, for ``None``,
+    deleted) for all of them when the session commits, along with other
+    pending translations.
+    """
+    cls = query.column_descriptions[0]['type']
+    columns = dict(
+        (attr_name, column)
+        for column, attr_name in translatable_models.get(cls, {}).items()
+    )
+
+    translatable_values = {}
+    update_values = {}
+    for key, value in values.items():
+        attr_name = getattr(key, 'key', key)
+        if attr_name in columns:
+            if isinstance(value, TaalTranslatableString):
+                value = value.pending_value
+            translatable_values[attr_name] = value
+            if is_translatable_value(value):
+                # written to the db as a placeholder
+                value = TaalTranslatableString()
+                pending_translatables.add(value)
+        update_values[key] = value
+
+    if not translatable_values:
+        return Query.update(query, values, synchronize_session)
+
+    session = query.session
+    mapper = inspect(cls)
+    primary_keys = query.with_entities(*mapper.primary_key).all()
+
+    bulk_updating_sessions.add(session)
+    try:
+        result = Query.update(query, update_values, synchronize_session)
+    finally:
+        bulk_updating_sessions.discard(session)
+
+    log = get_flush_log(session)
+    for attr_name, value in translatable_values.items():
+        column = columns[attr_name]
+        context = get_context(cls, column.name)
+        for primary_key in primary_keys:
+            translatable = TaalTranslatableString(
+                context=context,
+                message_id=get_message_id_from_primary_key(primary_key),
+                pending_value=value,
+            )
+            # no target instance; the translatable is logged directly
+            log.add(session.transaction, None, column, translatable)
+
+    # instances in the session hold stale values
+    for primary_key in primary_keys:
+        identity_key = mapper.identity_key_from_primary_key(primary_key)
+        obj = session.identity_map.get(identity_key)
+        if obj is not None:
+            session.expire(obj, list(translatable_values))
+
+    return result
+
+
+class TranslatableQuery(Query):
+    """ Query supporting bulk updates of translatable columns
+
+    Usage:
+        Session = sessionmaker(query_cls=TranslatableQuery)
+    """
+
+    def update(self, values, synchronize_session='evaluate'):
+        return bulk_update(self, values, synchronize_session)
@@ -1,11 +1,13 @@
-from weakref import WeakKeyDictionary
+import itertools
+from collections import OrderedDict
+from weakref import WeakKeyDictionary, WeakSet
 
 from sqlalchemy import event, inspect
 from sqlalchemy.orm.attributes import get_history
 
 from taal.sqlalchemy.types import (
     TranslatableString, pending_translatables, make_from_obj,
-    translatable_models)
+    get_message_id, translatable_models)
 from taal.constants import PlaceholderValue
 from taal.translatablestring import (
     is_translatable_value,
@@ -15,6 +17,72 @@ from taal.translatablestring import (
 
 translator_registry = WeakKeyDictionary()
 flush_log = WeakKeyDictionary()
+bulk_updating_sessions = WeakSet()  # see ``taal.sqlalchemy.bulk``
+
+
+class FlushLog(object):
+    """ Translations to save when a session commits
+
+    Entries are kept per transaction, so rolling back a (nested)
+    transaction discards its entries in one go. Within a transaction,
+    logging the same (target, column) again replaces the earlier entry.
+    """
+
+    def __init__(self):
+        self._transactions = {}  # transaction -> {key: (seq, entry...)}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._transactions.values())
+
+    def add(self, transaction, target, column, value):
+        """ Log ``value`` for ``column`` of ``target``
+
+        Targets may be ``None`` for rows without an instance (see
+        ``taal.sqlalchemy.bulk``), in which case ``value`` must be a
+        ``TranslatableString``
+        """
+        if target is None:
+            key = (column, value.context, value.message_id)
+        else:
+            # targets are kept alive by the log, so ids aren't reused
+            key = (id(target), column)
+        entries = self._transactions.setdefault(transaction, {})
+        entries[key] = (next(self._counter), target, column, value)
+
+    def discard(self, transaction):
+        self._transactions.pop(transaction, None)
+
+    def release(self, transaction, parent):
+        """ Move entries for ``transaction`` (a released savepoint) to
+        ``parent``
+        """
+        entries = self._transactions.pop(transaction, None)
+        if not entries:
+            return
+        parent_entries = self._transactions.setdefault(parent, {})
+        for key, entry in entries.iteritems():
+            if key not in parent_entries or parent_entries[key][0] < entry[0]:
+                parent_entries[key] = entry
+
+    def entries(self):
+        """ (target, column, value) tuples, in the order logged
+
+        Only the last entry per key (across transactions) is included
+        """
+        latest = {}
+        for entries in self._transactions.itervalues():
+            for key, entry in entries.iteritems():
+                if key not in latest or latest[key][0] < entry[0]:
+                    latest[key] = entry
+        return [entry[1:] for entry in sorted(latest.itervalues())]
+
+
+def get_flush_log(session):
+    try:
+        return flush_log[session]
+    except KeyError:
+        return flush_log.setdefault(session, FlushLog())
 
 
 def register_translator(owner, translator):
@@ -81,11 +149,17 @@ def refresh(target, args, attrs):
     return target
 
 
-def add_to_flush_log(session, target, delete=False):
+def add_to_flush_log(session, target, delete=False, changed=None):
+    """ Log translatable columns of ``target``
+
+    Only columns in ``changed`` (attribute names) are considered, if
+    given
+    """
     cls = target.__class__
     for column, attr_name in translatable_models.get(cls, {}).items():
-        history = get_history(target, attr_name)
-        if not delete and not history.has_changes():
+        if changed is not None and attr_name not in changed:
+            continue
+        if not delete and not get_history(target, attr_name).has_changes():
             # for non-delete actions, we're only interested in changed columns
             continue
 
@@ -96,8 +170,7 @@ def add_to_flush_log(session, target, delete=False):
         if is_translatable_value(value):
             pending_translatables.add(value)
             value = value.pending_value
-        flush_log.setdefault(session, []).append(
-            (session.transaction, target, column, value))
+        get_flush_log(session).add(session.transaction, target, column, value)
 
 
 def before_flush(session, flush_context, instances):
@@ -114,8 +187,12 @@ def before_flush(session, flush_context, instances):
     """
 
     for target in session.dirty:
-        if session.is_modified(target):
-            add_to_flush_log(session, target)
+        if type(target) not in translatable_models:
+            continue
+        # only attributes set since loading can have changed
+        changed = inspect(target).committed_state
+        if changed:
+            add_to_flush_log(session, target, changed=changed)
 
     for target in session.new:
         add_to_flush_log(session, target)
@@ -125,31 +202,82 @@ def before_flush(session, flush_context, instances):
 
 
 def after_bulk_update(update_context):
+    if update_context.session in bulk_updating_sessions:
+        # translations handled by ``taal.sqlalchemy.bulk.bulk_update``
+        return
+
     # bulk updating to None would be ok, but leaves dangling Translations
     result = update_context.result
     for bind in result.context.compiled.binds.values():
         field_type = bind.type
         if isinstance(field_type, TranslatableString):
-            raise NotImplementedError("Bulk updates are not yet supported")
+            raise NotImplementedError(
+                "Bulk updates of translatable columns need to use "
+                "``taal.sqlalchemy.bulk_update`` (or ``TranslatableQuery``)")
 
 
 def after_commit(session):
-    """ Save any pending translations for this session """
-    for transaction, target, column, value in flush_log.pop(session, []):
-        translator = get_translator(session)
+    """ Save any pending translations for this session
 
-        translatable = make_from_obj(target, column.name, value)
+    All pending translations are written in a single transaction (using
+    the translator's session), with a bulk delete and a bulk upsert
+    """
+    transaction = session.transaction
+    if transaction is not None and transaction.nested:
+        # a savepoint was released. its translations are saved when the
+        # enclosing transaction commits (and dropped if it rolls back)
+        if session in flush_log:
+            flush_log[session].release(transaction, transaction._parent)
+        return
+
+    log = flush_log.pop(session, None)
+    if not log:
+        return
+    pending = log.entries()
+
+    translator = get_translator(session)
+
+    # the log is processed as a whole, but with the same outcome as
+    # replaying it in order: any deletion removes all existing translations
+    # for a (context, message_id), and the last value logged is saved
+    to_save = OrderedDict()
+    to_delete = OrderedDict()
+    for target, column, value in pending:
+        if target is None:
+            # logged by a bulk operation
+            translatable = value
+            value = translatable.pending_value
+        else:
+            translatable = make_from_obj(target, column.name, value)
+        key = (translatable.context, translatable.message_id)
         if is_translatable_value(value):
-            translator.save_translation(translatable, commit=True)
+            to_save[key] = translatable
         else:
             # a non-translatable value in the commit log indicates a deletion
-            translator.delete_translations(translatable)
+            to_save.pop(key, None)
+            to_delete[key] = translatable
+
+    translator.delete_translations_many(to_delete.values(), commit=False)
+    translator.save_translations(to_save.values(), commit=False)
+    translator.session.commit()
+
+    language = translator.language
+    translator.invalidate(
+        [(context, message_id, None) for context, message_id in to_delete] +
+        [(context, message_id, language) for context, message_id in to_save]
+    )
 
+    for target, column, value in pending:
+        if target is None:
+            continue
         attr_name = get_attr_name(target, column)
+        if attr_name in inspect(target).unloaded:
+            # expired (e.g. by a savepoint rollback); reloaded as needed
+            continue
         old_value = getattr(target, attr_name)
         if is_translatable_value(old_value):
             # we may now have a primary key
-            old_value.message_id = translatable.message_id
+            old_value.message_id = get_message_id(target)
             # value is now saved. No need to keep around
             old_value.pending_value = None
 
@@ -157,9 +285,7 @@ def after_commit(session):
 def after_soft_rollback(session, previous_transaction):
     """ Drop any pending translations from this transaction """
     if session in flush_log:
-        flush_log[session] = [
-            pending for pending in flush_log[session]
-            if pending[0] != previous_transaction]
+        flush_log[session].discard(previous_transaction)
 
 
 def register_session(session):
@@ -62,12 +62,20 @@ def get_context(obj, column):
 
 
 def get_message_id(obj):
-    cls = obj.__class__
-    mapper = inspect(cls)
-    primary_keys = mapper.primary_key_from_instance(obj)
+    # use the identity if known; unlike the primary key attributes, it's
+    # available without loading expired instances
+    primary_keys = inspect(obj).identity
+    if primary_keys is None:
+        cls = obj.__class__
+        mapper = inspect(cls)
+        primary_keys = mapper.primary_key_from_instance(obj)
+    return get_message_id_from_primary_key(primary_keys)
+
+
+def get_message_id_from_primary_key(primary_keys):
     if any(key is None for key in primary_keys):
         return None
-    return json.dumps(primary_keys)
+    return json.dumps(list(primary_keys))
 
 
 def make_from_obj(obj, column, pending_value):
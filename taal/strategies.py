@@ -1,84 +1,205 @@
 from __future__ import absolute_import
 
-from sqlalchemy.sql.expression import and_, or_
+import copy
 
+from sqlalchemy.sql.expression import and_, select
+
+from taal.constants import DELETED
 from taal.translatablestring import TranslatableString
+from taal.utils import DEFAULT_CHUNK_SIZE, chunked, key_filter
 
 
 TRANSLATION_MISSING = "<TranslationMissing sentinel>"
 
 
-class Strategy(object):
+class LookupContext(object):
+    """
+    Per-call state for translating a translatable 'structure'
+
+    Strategies are shared (e.g. between threads), so anything specific to
+    a single ``Translator.translate`` call lives here instead. Created by
+    ``Strategy.bind_params``
+    """
 
-    def bind_params(self, language, model, session):
+    def __init__(
+            self, strategy, language, model, session,
+            chunk_size=DEFAULT_CHUNK_SIZE, shared_cache=None,
+            request_cache=None, write_behind=None):
+        self.strategy = strategy
         self.language = language
         self.model = model
         self.session = session
-        return self
-
-    def translate(self, translatable):
-        try:
-            return self.cache[
-                (translatable.context, translatable.message_id, self.language)
-            ]
-        except KeyError:
-            return self.translation_missing(translatable)
-
-    def translation_missing(self, translatable):
-        raise NotImplementedError
+        self.chunk_size = chunk_size
+        self.shared_cache = shared_cache
+        self.request_cache = request_cache
+        self.write_behind = write_behind
+        self.cache = {}
 
     def recursive_translate(self, translatable):
+        """
+        Translate a translatable 'structure'
+
+        All translations required are bulk loaded up front (a single
+        query), after which the structure is translated from the cache
+        """
         self.cache = self._prepare_cache(translatable)
+        return self._translate_structure(translatable)
+
+    def recursive_translate_multi(self, translatable, languages):
+        """
+        Translate a translatable 'structure' into each of ``languages``
 
+        returns a dict of {language: translated structure}. Translations
+        for all languages are loaded together (a single query)
+        """
+        lookups = [self.for_language(language) for language in languages]
+
+        load_languages = []
+        for lookup in lookups:
+            for language in self.strategy.languages(lookup):
+                if language not in load_languages:
+                    load_languages.append(language)
+
+        cache = self._prepare_cache(translatable, load_languages)
+
+        translated = {}
+        for lookup in lookups:
+            lookup.cache = cache
+            translated[lookup.language] = lookup._translate_structure(
+                translatable)
+        return translated
+
+    def for_language(self, language):
+        """ Copy of this lookup context, for another language """
+        lookup = copy.copy(self)
+        lookup.language = language
+        lookup.cache = {}
+        return lookup
+
+    def _translate_structure(self, translatable):
         if isinstance(translatable, TranslatableString):
-            return self.translate(translatable)
+            return self.strategy.translate(self, translatable)
         elif isinstance(translatable, dict):
             return dict(
-                (key, self.recursive_translate(val))
+                (key, self._translate_structure(val))
                 for key, val in translatable.iteritems()
             )
         elif isinstance(translatable, list):
-            return [self.recursive_translate(item) for item in translatable]
+            return [self._translate_structure(item) for item in translatable]
         elif isinstance(translatable, tuple):
-            return tuple(self.recursive_translate(item)
+            return tuple(self._translate_structure(item)
                          for item in translatable)
         else:
             return translatable
 
-    def _prepare_cache(self, translatable):
+    def _prepare_cache(self, translatable, languages=None):
         """
         Bulk load translations required to translate a translatable
-        'structure'
+        'structure' (into ``languages``, by default those required by the
+        strategy)
+
+        Translations are looked up in the ``request_cache`` and
+        ``shared_cache`` (if bound), in that order. Only translations not
+        found in either are loaded from the db, after which they are
+        added to the caches. Finally, writes queued in ``write_behind`` (if
+        bound) are applied
         """
         translatable_pks = self._collect_translatables(translatable)
         if not translatable_pks:
             return {}
 
-        pk_filter = or_(*(
-            and_(
-                self.model.context == context,
-                self.model.message_id == message_id,
+        if languages is None:
+            languages = self.strategy.languages(self)
+
+        if self.write_behind is None:
+            overlay = {}
+        else:
+            # taken before loading, so writes landing meanwhile aren't lost
+            overlay = self.write_behind.overlay(translatable_pks, languages)
+
+        cache = {}
+        misses = translatable_pks
+        consulted = []
+        for translation_cache in (self.request_cache, self.shared_cache):
+            if translation_cache is None or not misses:
+                continue
+            generation = translation_cache.generation
+            found = translation_cache.get_many(
+                self._cache_keys(misses, languages))
+            cache.update(
+                (key, value) for key, value in found.iteritems()
+                if value is not None)
+            consulted.append((translation_cache, misses, generation))
+            misses = set(
+                (context, message_id)
+                for context, message_id, language
+                in self._cache_keys(misses, languages)
+                if (context, message_id, language) not in found
             )
-            for context, message_id in translatable_pks
-        ))
-
-        translations = (
-            self.session.query(self.model)
-            .filter(self._language_filter())
-            .filter(pk_filter)
-        )
-        cache = {
-            (
-                t.context.decode('utf8'),
-                t.message_id.decode('utf8'),
-                t.language.decode('utf8'),
-            ): t.value.decode('utf8')
-            for t in translations
-        }
+
+        if misses:
+            loaded, num_queries = self._load_translations(misses, languages)
+            cache.update(loaded)
+        else:
+            num_queries = 0
+
+        for translation_cache, cache_misses, generation in consulted:
+            # also cache misses (as ``None``), so we don't keep looking
+            # for translations that don't exist
+            translation_cache.update((
+                (key, cache.get(key))
+                for key in self._cache_keys(cache_misses, languages)
+            ), generation, queries=num_queries)
+
+        for key, value in overlay.iteritems():
+            if value is DELETED:
+                cache.pop(key, None)
+            else:
+                cache[key] = value
+
         return cache
 
-    def _language_filter(self):
-        return self.model.language == self.language
+    @staticmethod
+    def _cache_keys(translatable_pks, languages):
+        return [
+            (context, message_id, language)
+            for context, message_id in translatable_pks
+            for language in languages
+        ]
+
+    def _load_translations(self, translatable_pks, languages):
+        """
+        Load translations from the db
+
+        returns a (translations, number of queries issued) tuple
+        """
+        model = self.model
+        session = self.session
+        dialect = session.get_bind(model).dialect
+
+        cache = {}
+        num_queries = 0
+        for chunk in chunked(translatable_pks, self.chunk_size):
+            # select plain rows rather than model instances; we don't want
+            # (or need) these in the session's identity map
+            query = select([
+                model.context, model.message_id, model.language, model.value,
+            ]).where(and_(
+                self._language_filter(languages),
+                key_filter(model, chunk, dialect),
+            ))
+            rows = session.execute(query, mapper=model)
+            cache.update(
+                ((context, message_id, language), value)
+                for context, message_id, language, value in rows
+            )
+            num_queries += 1
+        return cache, num_queries
+
+    def _language_filter(self, languages):
+        if len(languages) == 1:
+            return self.model.language == languages[0]
+        return self.model.language.in_(languages)
 
     def _collect_translatables(self, translatable, collection=None):
         """
@@ -105,45 +226,136 @@ class Strategy(object):
         return collection
 
 
+class Strategy(object):
+    """
+    Policy for translating a ``TranslatableString``, in particular when no
+    translation is available
+
+    Strategy instances hold no per-call state (see ``LookupContext``), and
+    may be shared freely, e.g. between threads
+    """
+
+    def bind_params(
+            self, language, model, session, chunk_size=DEFAULT_CHUNK_SIZE,
+            shared_cache=None, request_cache=None, write_behind=None):
+        return LookupContext(
+            self, language, model, session, chunk_size=chunk_size,
+            shared_cache=shared_cache, request_cache=request_cache,
+            write_behind=write_behind)
+
+    def translate(self, lookup, translatable):
+        try:
+            return lookup.cache[
+                (translatable.context, translatable.message_id,
+                    lookup.language)
+            ]
+        except KeyError:
+            return self.translation_missing(lookup, translatable)
+
+    def translation_missing(self, lookup, translatable):
+        raise NotImplementedError
+
+    def languages(self, lookup):
+        """ Languages to load translations for """
+        return [lookup.language]
+
+
 class NoneStrategy(Strategy):
 
-    def translation_missing(self, translatable):
+    def translation_missing(self, lookup, translatable):
         return None
 
 
 class SentinelStrategy(Strategy):
 
-    def translation_missing(self, translatable):
+    def translation_missing(self, lookup, translatable):
         return TRANSLATION_MISSING
 
 
 class DebugStrategy(Strategy):
 
-    def get_debug_translation(self, translatable):
+    def get_debug_translation(self, lookup, translatable):
         return u"[Translation missing ({}, {}, {})]".format(
-            self.language, translatable.context, translatable.message_id)
+            lookup.language, translatable.context, translatable.message_id)
+
+    def translation_missing(self, lookup, translatable):
+        return self.get_debug_translation(lookup, translatable)
+
+
+class FallbackChainStrategy(Strategy):
+    """
+    Fall back through a chain of languages, e.g. ``fr-CA -> fr -> en``
+
+    The chain for a language is taken from ``fallbacks`` (a dict of
+    language -> list of fallback languages) where configured. Otherwise
+    (if ``derive_parents`` is set) it is made up of the language's BCP-47
+    parents, e.g. ``zh-Hant-TW -> zh-Hant -> zh``. ``default_lang``, if
+    given, ends every chain.
+
+    Translations for every language in the chain are loaded with the same
+    query, so longer chains cost no extra round trips. If none are found,
+    returns the sentinel value (:data:`taal.TRANSLATION_MISSING`)
+    """
+
+    def __init__(
+            self, fallbacks=None, default_lang=None, derive_parents=True):
+        self.fallbacks = fallbacks or {}
+        self.default_lang = default_lang
+        self.derive_parents = derive_parents
+
+    def fallback_chain(self, language):
+        """ Languages to try, in order, if ``language`` is missing """
+        if language in self.fallbacks:
+            chain = list(self.fallbacks[language])
+        elif self.derive_parents:
+            chain = get_parent_languages(language)
+        else:
+            chain = []
+
+        if self.default_lang is not None:
+            chain.append(self.default_lang)
+
+        unique_chain = []
+        for fallback in chain:
+            if fallback != language and fallback not in unique_chain:
+                unique_chain.append(fallback)
+        return unique_chain
+
+    def translation_missing(self, lookup, translatable):
+        for language in self.fallback_chain(lookup.language):
+            try:
+                return lookup.cache[(
+                    translatable.context,
+                    translatable.message_id,
+                    language,
+                )]
+            except KeyError:
+                continue
+        return TRANSLATION_MISSING
 
-    def translation_missing(self, translatable):
-        return self.get_debug_translation(translatable)
+    def languages(self, lookup):
+        return [lookup.language] + self.fallback_chain(lookup.language)
 
 
-class FallbackLangStrategy(Strategy):
+class FallbackLangStrategy(FallbackChainStrategy):
+    """ Fall back to a single language, ``fallback_lang`` """
 
     def __init__(self, fallback_lang):
+        super(FallbackLangStrategy, self).__init__(
+            default_lang=fallback_lang, derive_parents=False)
         self.fallback_lang = fallback_lang
 
-    def translation_missing(self, translatable):
-        try:
-            return self.cache[(
-                translatable.context,
-                translatable.message_id,
-                self.fallback_lang,
-            )]
-        except KeyError:
-            return TRANSLATION_MISSING
 
-    def _language_filter(self):
-        return or_(
-            self.model.language == self.language,
-            self.model.language == self.fallback_lang,
-        )
+def get_parent_languages(language):
+    """ BCP-47 parents of ``language``, most specific first
+
+    e.g. ``zh-Hant-TW`` -> ``['zh-Hant', 'zh']``. Subtags may also be
+    separated by underscores (``fr_CA``)
+    """
+    parents = []
+    while True:
+        index = max(language.rfind('-'), language.rfind('_'))
+        if index <= 0:
+            return parents
+        language = language[:index]
+        parents.append(language)
@@ -0,0 +1,147 @@
+from __future__ import absolute_import
+
+import hashlib
+from collections import defaultdict
+from itertools import islice
+
+from sqlalchemy import tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import Insert, and_, or_
+
+
+# dialects that don't support composite (row value) ``IN`` lists, i.e.
+# ``(context, message_id) IN ((..., ...), (..., ...))``
+NO_TUPLE_IN_DIALECTS = ('sqlite', 'mssql')
+
+# MySQL only uses indexes (range scans) for composite ``IN`` lists from 5.7.3
+MYSQL_TUPLE_IN_VERSION = (5, 7, 3)
+
+# dialects supporting ``Upsert``
+UPSERT_DIALECTS = ('mysql', 'postgresql', 'sqlite')
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def chunked(iterable, size):
+    """ Split ``iterable`` into lists of at most ``size`` items """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def prefix_filter(column, prefix):
+    """ Filter on ``column`` starting with ``prefix``
+
+    A ``LIKE 'prefix%'``, which can be served by a range scan on an index
+    starting with ``column``. Wildcards in ``prefix`` are escaped
+    """
+    escaped = prefix.replace('/', '//').replace('%', '/%').replace('_', '/_')
+    return column.like(escaped + '%', escape='/')
+
+
+def value_hash(value):
+    """ Hash of a translation value, as stored in suggestion indexes """
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return hashlib.sha1(value).hexdigest()
+
+
+def keyset_filter(model, after):
+    """ Filter on (context, message_id) sorting after ``after``
+
+    Spelled out (rather than as a row value comparison) so that all
+    dialects can use the primary key index
+    """
+    context, message_id = after
+    return or_(
+        model.context > context,
+        and_(model.context == context, model.message_id > message_id),
+    )
+
+
+def supports_tuple_in(dialect):
+    """ Whether ``dialect`` can use an index for composite ``IN`` lists """
+    if dialect.name in NO_TUPLE_IN_DIALECTS:
+        return False
+    if dialect.name == 'mysql':
+        # unknown before connecting
+        version = getattr(dialect, 'server_version_info', None)
+        return version is not None and version >= MYSQL_TUPLE_IN_VERSION
+    return True
+
+
+def key_filter(model, keys, dialect):
+    """ Filter matching any of the (context, message_id) tuples in ``keys``
+
+    Uses a composite ``IN`` where the dialect supports it (and can use an
+    index for it); otherwise message ids are grouped by context, giving one
+    ``IN`` per context
+    """
+    if supports_tuple_in(dialect):
+        return tuple_(model.context, model.message_id).in_(list(keys))
+
+    message_ids_by_context = defaultdict(list)
+    for context, message_id in keys:
+        message_ids_by_context[context].append(message_id)
+
+    return or_(*(
+        and_(
+            model.context == context,
+            model.message_id.in_(message_ids),
+        )
+        for context, message_ids in message_ids_by_context.iteritems()
+    ))
+
+
+class Upsert(Insert):
+    """ Multi-row INSERT, updating ``update_columns`` on primary key
+    conflicts
+
+    Only supported by ``UPSERT_DIALECTS``. Rows in a single statement must
+    have distinct primary keys
+
+    With ``increment``, ``update_columns`` are incremented by the inserted
+    values rather than replaced
+    """
+
+    def __init__(self, table, values, update_columns, increment=False):
+        super(Upsert, self).__init__(table, values)
+        self.update_columns = update_columns
+        self.increment = increment
+
+
+@compiles(Upsert, 'mysql')
+def _compile_upsert_mysql(upsert, compiler, **kwargs):
+    quote = compiler.preparer.quote
+    statement = compiler.visit_insert(upsert, **kwargs)
+    if upsert.increment:
+        template = '{0} = {0} + VALUES({0})'
+    else:
+        template = '{0} = VALUES({0})'
+    updates = ', '.join(
+        template.format(quote(name))
+        for name in upsert.update_columns
+    )
+    return '{} ON DUPLICATE KEY UPDATE {}'.format(statement, updates)
+
+
+@compiles(Upsert, 'postgresql', 'sqlite')
+def _compile_upsert_on_conflict(upsert, compiler, **kwargs):
+    quote = compiler.preparer.quote
+    statement = compiler.visit_insert(upsert, **kwargs)
+    primary_key = ', '.join(
+        quote(column.name) for column in upsert.table.primary_key)
+    if upsert.increment:
+        template = '{0} = {1}.{0} + excluded.{0}'
+    else:
+        template = '{0} = excluded.{0}'
+    table_name = compiler.preparer.format_table(upsert.table)
+    updates = ', '.join(
+        template.format(quote(name), table_name)
+        for name in upsert.update_columns
+    )
+    return '{} ON CONFLICT ({}) DO UPDATE SET {}'.format(
+        statement, primary_key, updates)
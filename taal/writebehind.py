@@ -0,0 +1,293 @@
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from taal import Translator
+from taal.constants import DELETED
+from taal.exceptions import QueueFull
+from taal.translatablestring import TranslatableString
+from taal.utils import DEFAULT_CHUNK_SIZE
+
+
+log = logging.getLogger(__name__)
+
+
+class PendingWrites(object):
+    """ Coalesced writes for a single (context, message_id) """
+
+    def __init__(self):
+        # delete all existing translations (before saving ``values``)
+        self.delete = False
+        self.values = OrderedDict()  # language -> value
+
+
+class WriteBehindQueue(object):
+    """
+    Write translations in the background
+
+    Translators created with ``write_behind=queue`` add writes to the queue
+    and return immediately. A worker thread writes them in batches of up
+    to ``batch_size`` (context, message_id)s, using a session from
+    ``session_factory``: one bulk delete and one bulk upsert per language.
+
+    Writes are coalesced while queued: the last value saved for a
+    (context, message_id, language) wins, and deleting a (context,
+    message_id) drops values saved for it before.
+
+    At most ``max_pending`` (context, message_id)s are queued. Writers then
+    block until the worker catches up, raising :class:`QueueFull` if that
+    takes longer than ``timeout`` seconds (default: wait indefinitely).
+
+    Translators reading with the queue see queued writes (read your
+    writes), but other processes only see them once written. Pass the
+    ``shared_cache`` used by those translators, so the worker invalidates
+    it after writing.
+
+    Usage:
+        queue = WriteBehindQueue(Translation, sessionmaker(bind=engine))
+        translator = Translator(
+            Translation, session, 'en', write_behind=queue)
+        ...
+        queue.close()  # at shutdown
+
+    Queued writes are lost if the process exits without calling ``close``
+    (or ``flush``).
+
+    With ``skip_unchanged``, the worker only writes values that differ from
+    those stored (see ``Translator.save_translations``). Translations saved
+    and skipped are counted in ``written`` and ``skipped``.
+
+    The worker keeps counts in ``summary_model`` and the suggestion index in
+    ``suggestion_model`` up to date, if given (see ``Translator``).
+    """
+
+    def __init__(
+            self, model, session_factory, shared_cache=None,
+            max_pending=10000, batch_size=DEFAULT_CHUNK_SIZE, timeout=None,
+            skip_unchanged=False, summary_model=None, suggestion_model=None):
+        self.model = model
+        self.session_factory = session_factory
+        self.shared_cache = shared_cache
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.skip_unchanged = skip_unchanged
+        self.summary_model = summary_model
+        self.suggestion_model = suggestion_model
+
+        self.written = 0
+        self.skipped = 0
+
+        self._pending = OrderedDict()  # (context, message_id) -> writes
+        self._in_flight = {}  # the batch being written
+        self._condition = threading.Condition()
+        self._closed = False
+        self._error = None
+        self._thread = None
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending) + len(self._in_flight)
+
+    def save(self, translatables, language):
+        """ Queue saving the pending values of ``translatables``
+
+        Either all or none of ``translatables`` are queued
+        """
+        translatables = list(translatables)
+        with self._condition:
+            self._reserve(translatables)
+            for translatable in translatables:
+                writes = self._get_writes(translatable)
+                writes.values[language] = translatable.pending_value
+            self._condition.notify_all()
+
+    def delete(self, translatables):
+        """ Queue deleting _all_ translations for ``translatables``
+
+        Either all or none of ``translatables`` are queued
+        """
+        translatables = list(translatables)
+        with self._condition:
+            self._reserve(translatables)
+            for translatable in translatables:
+                writes = self._get_writes(translatable)
+                writes.delete = True
+                writes.values.clear()
+            self._condition.notify_all()
+
+    def overlay(self, translatable_pks, languages):
+        """ Queued writes for (context, message_id)s, in ``languages``
+
+        Returns a dict of (context, message_id, language) -> value, where
+        a value of ``taal.constants.DELETED`` means the translation is being
+        deleted
+        """
+        overlay = {}
+        with self._condition:
+            if not self._pending and not self._in_flight:
+                return overlay
+
+            for pk in translatable_pks:
+                context, message_id = pk
+                # the in flight batch was queued before anything pending
+                for writes in (self._in_flight.get(pk), self._pending.get(pk)):
+                    if writes is None:
+                        continue
+                    if writes.delete:
+                        for language in languages:
+                            overlay[(context, message_id, language)] = (
+                                DELETED)
+                    for language, value in writes.values.iteritems():
+                        if language in languages:
+                            overlay[(context, message_id, language)] = value
+        return overlay
+
+    def flush(self):
+        """ Wait for all queued writes to be written
+
+        Re-raises the error of any batch that failed to write since the
+        last call (failed batches are logged, and dropped), or of failing
+        to create the worker's session
+        """
+        with self._condition:
+            while self._pending or self._in_flight:
+                self._condition.wait()
+            error, self._error = self._error, None
+
+        if error is not None:
+            raise error
+
+    def close(self):
+        """ Write all queued writes and stop the worker """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def _reserve(self, translatables):
+        """ Wait for space for any of ``translatables`` not yet queued """
+        # called with the lock held
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+
+        self._wait_for_space(translatables)
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='taal-write-behind')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _get_writes(self, translatable):
+        # called with the lock held, after ``_reserve``
+        pk = (translatable.context, translatable.message_id)
+        return self._pending.setdefault(pk, PendingWrites())
+
+    def _num_new(self, translatables):
+        return len(set(
+            (translatable.context, translatable.message_id)
+            for translatable in translatables
+        ).difference(self._pending))
+
+    def _wait_for_space(self, translatables):
+        if self.timeout is None:
+            deadline = None
+        else:
+            deadline = time.time() + self.timeout
+
+        # more than ``max_pending`` new keys only fit in an empty queue
+        while self._pending and (
+                len(self._pending) + self._num_new(translatables) >
+                self.max_pending):
+            if deadline is None:
+                remaining = None
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise QueueFull(
+                        "{} translations waiting to be written".format(
+                            len(self._pending)))
+            self._condition.wait(remaining)
+
+    def _run(self):
+        try:
+            translator = Translator(
+                self.model, self.session_factory(), None,
+                shared_cache=self.shared_cache,
+                skip_unchanged=self.skip_unchanged,
+                summary_model=self.summary_model,
+                suggestion_model=self.suggestion_model)
+        except Exception as exc:
+            log.exception("Failed to start writing translations")
+            with self._condition:
+                # nothing queued can be written. drop it (as for failed
+                # batches), and start a new worker for the next write
+                self._pending.clear()
+                self._error = exc
+                self._thread = None
+                self._condition.notify_all()
+            return
+
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    # closed, and all written
+                    return
+
+                batch = OrderedDict()
+                while self._pending and len(batch) < self.batch_size:
+                    pk, writes = self._pending.popitem(last=False)
+                    batch[pk] = writes
+                self._in_flight = batch
+                # there's space in the queue again
+                self._condition.notify_all()
+
+            try:
+                self._write(translator, batch)
+                error = None
+            except Exception as exc:
+                log.exception("Failed to write translations")
+                translator.session.rollback()
+                error = exc
+
+            with self._condition:
+                self._in_flight = {}
+                if error is not None:
+                    self._error = error
+                self._condition.notify_all()
+
+    def _write(self, translator, batch):
+        to_delete = []
+        to_save = OrderedDict()  # language -> translatables
+        keys = []
+        for (context, message_id), writes in batch.iteritems():
+            if writes.delete:
+                to_delete.append(TranslatableString(context, message_id))
+                keys.append((context, message_id, None))
+            for language, value in writes.values.iteritems():
+                to_save.setdefault(language, []).append(
+                    TranslatableString(context, message_id, value))
+                keys.append((context, message_id, language))
+
+        translator.delete_translations_many(to_delete, commit=False)
+        results = [
+            translator.save_translations(
+                translatables, language=language, commit=False)
+            for language, translatables in to_save.iteritems()
+        ]
+        translator.session.commit()
+        translator.invalidate(keys)
+
+        with self._condition:
+            for result in results:
+                self.written += result.written
+                self.skipped += result.skipped
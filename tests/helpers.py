@@ -0,0 +1,27 @@
+from __future__ import absolute_import
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def count_queries(session):
+    """ Collect statements executed on ``session``'s engine
+
+        with count_queries(session) as queries:
+            ...
+        assert len(queries) == 1
+    """
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        queries.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(
+            engine, 'before_cursor_execute', before_cursor_execute)
@@ -1,16 +1,19 @@
 from __future__ import absolute_import
 
 from kaiso.exceptions import DeserialisationError
+from mock import patch
 import pytest
 
 from taal import Translator
 from taal.constants import PLACEHOLDER, PlaceholderValue
 from taal.exceptions import NoTranslatorRegistered
 from taal.kaiso import TYPE_CONTEXT
-from taal.kaiso.manager import collect_translatables
+from taal.kaiso.manager import (
+    TranslationBatch, collect_translatables, get_translator)
 from taal.kaiso.types import get_context, get_message_id
 from taal.translatablestring import TranslatableString
 
+from tests.helpers import count_queries
 from tests.models import Translation, CustomFieldsEntity
 
 
@@ -212,6 +215,66 @@ def test_delete(session_cls, bound_manager):
     assert session_cls().query(Translation).count() == 0
 
 
+def test_batch_translations(session_cls, bound_manager):
+    manager = bound_manager
+    manager.save(CustomFieldsEntity)
+
+    objs = [
+        CustomFieldsEntity(id=id_, name="name", extra1="extra", extra2=None)
+        for id_ in range(3)
+    ]
+    translator_session = get_translator(manager).session
+    with count_queries(translator_session) as queries:
+        with manager.batch_translations():
+            for obj in objs:
+                manager.save(obj)
+            objs[0].extra1 = None
+            manager.save(objs[0])
+            manager.delete(objs[1])
+            with manager.batch_translations():
+                manager.save(
+                    CustomFieldsEntity(id=3, name="name", extra1="extra"))
+
+            assert session_cls().query(Translation).count() == 0
+
+    upserts = [query for query in queries if query.startswith('INSERT')]
+    deletes = [query for query in queries if query.startswith('DELETE')]
+    assert len(upserts) == 1
+    assert len(deletes) == 1
+    # objs[0].name, objs[2] name and extra1, and the nested save
+    assert session_cls().query(Translation).count() == 5
+
+
+def test_batch_translations_written_on_error(session_cls, bound_manager):
+    manager = bound_manager
+    manager.save(CustomFieldsEntity)
+    deleted = CustomFieldsEntity(id=1, name="deleted")
+    manager.save(deleted)
+
+    with pytest.raises(ValueError):
+        with manager.batch_translations():
+            manager.save(CustomFieldsEntity(id=2, name="name"))
+            manager.delete(deleted)
+            raise ValueError()
+
+    # matching the graph, where the block's writes have already happened
+    assert session_cls().query(Translation.value).all() == [("name",)]
+    translator = get_translator(manager)
+    saved = manager.get(CustomFieldsEntity, id=2)
+    assert translator.translate(
+        manager.serialize(saved)['name']) == 'name'
+
+
+def test_batch_translations_flush_error(bound_manager):
+    manager = bound_manager
+
+    with patch.object(
+            TranslationBatch, 'flush', side_effect=RuntimeError('boom')):
+        with pytest.raises(ValueError):
+            with manager.batch_translations():
+                raise ValueError()
+
+
 def test_missing_bind(session, translating_manager):
     manager = translating_manager
     manager.save(CustomFieldsEntity)
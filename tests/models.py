@@ -7,7 +7,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from kaiso.types import Entity
 from kaiso.attributes import Integer as KaisoInteger, String as KaisoString
 
-from taal.models import TranslationMixin
+from taal.models import (
+    TranslationMixin, TranslationSuggestionMixin, TranslationSummaryMixin)
 from taal import kaiso as taal_kaiso, sqlalchemy as taal_sqlalchemy
 from taal.kaiso import types as taal_kaiso_types
 from taal.sqlalchemy import types as taal_sqlalchemy_types
@@ -20,6 +21,14 @@ class Translation(TranslationMixin, Base):
     __tablename__ = "translations"
 
 
+class TranslationSummary(TranslationSummaryMixin, Base):
+    __tablename__ = "translation_summaries"
+
+
+class TranslationSuggestion(TranslationSuggestionMixin, Base):
+    __tablename__ = "translation_suggestions"
+
+
 class CustomFieldsEntity(Entity):
     id = KaisoInteger(unique=True)
     identifier = KaisoString()
@@ -0,0 +1,135 @@
+from __future__ import absolute_import
+
+from mock import patch
+import pytest
+
+from taal.cache import TranslationCache
+
+
+def test_get_and_set():
+    cache = TranslationCache()
+    cache[('context', 'message_id', 'en')] = 'value'
+
+    assert cache[('context', 'message_id', 'en')] == 'value'
+    assert ('context', 'message_id', 'en') in cache
+    assert ('context', 'message_id', 'fr') not in cache
+    with pytest.raises(KeyError):
+        cache[('context', 'message_id', 'fr')]
+
+
+def test_cache_missing_translation():
+    cache = TranslationCache()
+    cache[('context', 'message_id', 'en')] = None
+
+    assert ('context', 'message_id', 'en') in cache
+    assert cache[('context', 'message_id', 'en')] is None
+
+
+def test_max_entries_evicts_least_recently_used():
+    cache = TranslationCache(max_entries=2)
+    cache[('context', '1', 'en')] = 'one'
+    cache[('context', '2', 'en')] = 'two'
+    cache[('context', '1', 'en')]  # use, so '2' is now the oldest
+    cache[('context', '3', 'en')] = 'three'
+
+    assert len(cache) == 2
+    assert ('context', '1', 'en') in cache
+    assert ('context', '2', 'en') not in cache
+    assert ('context', '3', 'en') in cache
+
+
+def test_max_size():
+    cache = TranslationCache(max_size=1)
+    cache[('context', '1', 'en')] = 'one'
+    assert len(cache) == 0
+    assert cache.size == 0
+
+    cache = TranslationCache()
+    cache[('context', '1', 'en')] = 'one'
+    entry_size = cache.size
+
+    cache = TranslationCache(max_size=entry_size * 2)
+    cache[('context', '1', 'en')] = 'one'
+    cache[('context', '2', 'en')] = 'two'
+    cache[('context', '3', 'en')] = 'six'
+    assert len(cache) == 2
+    assert ('context', '1', 'en') not in cache
+
+
+@patch('taal.cache.time')
+def test_ttl(time):
+    time.time.return_value = 100
+    cache = TranslationCache(ttl=10)
+    cache[('context', 'message_id', 'en')] = 'value'
+
+    time.time.return_value = 109
+    assert cache[('context', 'message_id', 'en')] == 'value'
+
+    time.time.return_value = 110
+    assert ('context', 'message_id', 'en') not in cache
+    assert len(cache) == 0
+
+
+def test_invalidate():
+    cache = TranslationCache()
+    cache[('context', 'message_id', 'en')] = 'value'
+    cache[('context', 'message_id', 'fr')] = 'valeur'
+    cache[('context', 'other', 'en')] = 'other'
+
+    cache.invalidate('context', 'message_id', 'en')
+    assert ('context', 'message_id', 'en') not in cache
+    assert ('context', 'message_id', 'fr') in cache
+
+    cache.invalidate('context', 'message_id')
+    assert ('context', 'message_id', 'fr') not in cache
+    assert ('context', 'other', 'en') in cache
+
+
+def test_get_many():
+    cache = TranslationCache()
+    cache[('context', '1', 'en')] = 'one'
+    cache[('context', '2', 'en')] = None
+
+    found = cache.get_many([
+        ('context', '1', 'en'),
+        ('context', '2', 'en'),
+        ('context', '3', 'en'),
+    ])
+    assert found == {
+        ('context', '1', 'en'): 'one',
+        ('context', '2', 'en'): None,
+    }
+    assert cache.hits == 2
+    assert cache.misses == 1
+
+
+def test_stale_update_dropped():
+    cache = TranslationCache()
+    generation = cache.generation
+    cache.invalidate('context', 'message_id')
+
+    cache.update([(('context', 'message_id', 'en'), 'stale')], generation)
+    assert ('context', 'message_id', 'en') not in cache
+
+    cache.update(
+        [(('context', 'message_id', 'en'), 'fresh')], cache.generation)
+    assert cache[('context', 'message_id', 'en')] == 'fresh'
+
+
+def test_update_counts_queries():
+    cache = TranslationCache()
+    generation = cache.generation
+    cache.invalidate('context', 'message_id')
+
+    cache.update([], queries=1)
+    cache.update(
+        [(('context', 'message_id', 'en'), 'stale')], generation, queries=2)
+    assert cache.queries == 3
+
+
+def test_clear():
+    cache = TranslationCache()
+    cache[('context', 'message_id', 'en')] = 'value'
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.size == 0
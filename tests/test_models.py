@@ -1,11 +1,15 @@
 from __future__ import absolute_import
 
+import itertools
+
 import pytest
 
-from taal import Translator
+from taal import Translator, TRANSLATION_MISSING
+from taal.cache import TranslationCache
 from taal.translatablestring import TranslatableString
 
-from tests.models import Translation
+from tests.helpers import count_queries
+from tests.models import Translation, TranslationSummary
 
 
 @pytest.mark.usefixtures('manager')
@@ -65,6 +69,148 @@ class TestModels(object):
             'translatable': 'translation',
         }
 
+    def test_translate_structure_single_query(self, session):
+        for message_id in range(10):
+            translation = Translation(
+                context='context', message_id=str(message_id),
+                language='language', value='translation')
+            session.add(translation)
+        session.commit()
+
+        translator = Translator(Translation, session, 'language')
+        structure = [
+            {
+                'translatable': TranslatableString(
+                    context='context', message_id=str(message_id)),
+                'nested': (TranslatableString(
+                    context='context', message_id='missing'),),
+            }
+            for message_id in range(10)
+        ]
+
+        with count_queries(session) as queries:
+            translation = translator.translate(structure)
+
+        assert len(queries) == 1
+        assert translation == [
+            {'translatable': 'translation', 'nested': (None,)}
+        ] * 10
+
+    def test_translate_leaves_identity_map_untouched(self, session):
+        translation = Translation(
+            context='context', message_id='message_id',
+            language='language', value='translation')
+        session.add(translation)
+        session.commit()
+        session.expunge_all()
+
+        translator = Translator(Translation, session, 'language')
+        translatable = TranslatableString(
+            context='context', message_id='message_id')
+
+        assert translator.translate(translatable) == 'translation'
+        assert len(session.identity_map) == 0
+
+    def test_translate_chunked(self, session):
+        for message_id in range(5):
+            translation = Translation(
+                context='context', message_id=str(message_id),
+                language='language', value=str(message_id))
+            session.add(translation)
+        session.commit()
+
+        translator = Translator(
+            Translation, session, 'language', chunk_size=2)
+        structure = [
+            TranslatableString(context='context', message_id=str(message_id))
+            for message_id in range(5)
+        ]
+
+        with count_queries(session) as queries:
+            translation = translator.translate(structure)
+
+        assert len(queries) == 3
+        assert translation == ['0', '1', '2', '3', '4']
+
+    def test_translate_iter(self, session):
+        for message_id in range(5):
+            translation = Translation(
+                context='context', message_id=str(message_id),
+                language='language', value=str(message_id))
+            session.add(translation)
+        session.commit()
+
+        translator = Translator(Translation, session, 'language')
+        items = (
+            {'translatable': TranslatableString(
+                context='context', message_id=str(message_id))}
+            for message_id in range(5)
+        )
+
+        with count_queries(session) as queries:
+            translated = list(
+                translator.translate_iter(items, window_size=2))
+
+        assert len(queries) == 3
+        assert translated == [
+            {'translatable': str(message_id)} for message_id in range(5)]
+
+    def test_translate_iter_is_lazy(self, session):
+        translation = Translation(
+            context='context', message_id='message_id',
+            language='language', value='translation')
+        session.add(translation)
+        session.commit()
+
+        translator = Translator(Translation, session, 'language')
+        translatable = TranslatableString(
+            context='context', message_id='message_id')
+        endless = itertools.repeat(translatable)
+
+        translated = translator.translate_iter(endless, window_size=10)
+        assert list(itertools.islice(translated, 15)) == (
+            ['translation'] * 15)
+
+    def test_translate_multi(self, session):
+        for language in ['en', 'fr']:
+            translation = Translation(
+                context='context', message_id='message_id',
+                language=language, value='translation {}'.format(language))
+            session.add(translation)
+        session.commit()
+
+        translator = Translator(Translation, session, 'language')
+        translatable = TranslatableString(
+            context='context', message_id='message_id')
+        structure = {'list': [translatable], 'translatable': translatable}
+
+        with count_queries(session) as queries:
+            translations = translator.translate_multi(
+                structure, ['en', 'fr', 'de'])
+
+        assert len(queries) == 1
+        assert translations == {
+            'en': {
+                'list': ['translation en'],
+                'translatable': 'translation en',
+            },
+            'fr': {
+                'list': ['translation fr'],
+                'translatable': 'translation fr',
+            },
+            'de': {
+                'list': [None],
+                'translatable': None,
+            },
+        }
+
+    def test_translate_multi_no_languages(self, session):
+        translator = Translator(Translation, session, 'language')
+        translatable = TranslatableString(
+            context='context', message_id='message_id')
+
+        assert translator.translate_multi(translatable, []) == {}
+
     def test_case_sensitivity(self, session):
         translation_lower = Translation(
             context='context', message_id='message_id',
@@ -120,3 +266,307 @@ class TestWriting(object):
         translation = translator.translate(read_translatable)
         assert translation == 'new translation'
         assert session.query(Translation).count() == 1
+
+    def test_save_translations(self, session):
+        translator = Translator(Translation, session, 'language')
+        translator.save_translation(TranslatableString(
+            context='context', message_id='0', pending_value='old'))
+
+        translatables = [
+            TranslatableString(
+                context='context', message_id=str(message_id),
+                pending_value='translation {}'.format(message_id))
+            for message_id in range(5)
+        ]
+        with count_queries(session) as queries:
+            translator.save_translations(translatables, chunk_size=2)
+
+        inserts = [query for query in queries if query.startswith('INSERT')]
+        assert len(inserts) == 3
+        assert session.query(Translation).count() == 5
+        assert translator.translate([
+            TranslatableString(context='context', message_id=str(message_id))
+            for message_id in range(5)
+        ]) == [
+            'translation {}'.format(message_id) for message_id in range(5)]
+
+    def test_save_translations_last_value_wins(self, session):
+        translator = Translator(Translation, session, 'language')
+        translator.save_translations([
+            TranslatableString(
+                context='context', message_id='message_id',
+                pending_value='first'),
+            TranslatableString(
+                context='context', message_id='message_id',
+                pending_value='second'),
+        ], language='other')
+
+        (translation,) = session.query(Translation).all()
+        assert translation.language == 'other'
+        assert translation.value == 'second'
+
+    def test_save_translations_skip_unchanged(self, session):
+        translator = Translator(
+            Translation, session, 'language', skip_unchanged=True)
+        translatables = [
+            TranslatableString(
+                context='context', message_id=str(message_id),
+                pending_value='translation')
+            for message_id in range(3)
+        ]
+        assert translator.save_translations(translatables) == (3, 0)
+
+        translatables[0].pending_value = 'changed'
+        with count_queries(session) as queries:
+            result = translator.save_translations(translatables)
+
+        assert result == (1, 2)
+        assert result.written == 1
+        assert result.skipped == 2
+        inserts = [query for query in queries if query.startswith('INSERT')]
+        assert len(inserts) == 1
+        assert translator.translate(translatables) == [
+            'changed', 'translation', 'translation']
+
+    def test_save_translations_unchanged_written_by_default(self, session):
+        translator = Translator(Translation, session, 'language')
+        translatable = TranslatableString(
+            context='context', message_id='message_id',
+            pending_value='translation')
+        translator.save_translations([translatable])
+
+        assert translator.save_translations([translatable]) == (1, 0)
+        assert translator.save_translations(
+            [translatable], skip_unchanged=True) == (0, 1)
+
+    @pytest.mark.parametrize('translatable', [
+        TranslatableString(context='context', pending_value='translation'),
+        TranslatableString(
+            context='context', message_id='message_id',
+            pending_value=TRANSLATION_MISSING),
+    ])
+    def test_save_translations_invalid(self, session, translatable):
+        translator = Translator(Translation, session, 'language')
+        with pytest.raises(RuntimeError):
+            translator.save_translations([translatable])
+        assert session.query(Translation).count() == 0
+
+    def test_delete_translations_many(self, session):
+        translator = Translator(Translation, session, 'language')
+        translator.save_translations([
+            TranslatableString(
+                context='context', message_id=str(message_id),
+                pending_value='translation')
+            for message_id in range(5)
+        ])
+        translator.save_translations([
+            TranslatableString(
+                context='context', message_id='0',
+                pending_value='translation')
+        ], language='other')
+
+        with count_queries(session) as queries:
+            translator.delete_translations_many([
+                TranslatableString(context='context', message_id='0'),
+                TranslatableString(context='context', message_id='1'),
+                TranslatableString(context='context', message_id='2'),
+            ], chunk_size=2)
+
+        deletes = [query for query in queries if query.startswith('DELETE')]
+        assert len(deletes) == 2
+        assert set(session.query(Translation.message_id)) == set([
+            ('3',), ('4',)])
+
+    def test_move_translations_many(self, session):
+        translator = Translator(Translation, session, 'language')
+        translator.save_translations([
+            TranslatableString(
+                context='context', message_id=str(message_id),
+                pending_value='translation {}'.format(message_id))
+            for message_id in range(3)
+        ])
+
+        with count_queries(session) as queries:
+            translator.move_translations_many([
+                (
+                    TranslatableString(context='context', message_id='0'),
+                    TranslatableString(context='new', message_id='0'),
+                ),
+                (
+                    TranslatableString(context='context', message_id='1'),
+                    TranslatableString(context='new', message_id='new'),
+                ),
+                (
+                    TranslatableString(context='context', message_id='2'),
+                    TranslatableString(context='context', message_id='two'),
+                ),
+            ])
+
+        updates = [query for query in queries if query.startswith('UPDATE')]
+        assert len(updates) == 2
+        assert set(session.query(
+            Translation.context, Translation.message_id, Translation.value
+        )) == set([
+            ('new', '0', 'translation 0'),
+            ('new', 'new', 'translation 1'),
+            ('context', 'two', 'translation 2'),
+        ])
+
+
+class TestCoverage(object):
+    def _populate(self, translator):
+        translator.save_translations([
+            TranslatableString(
+                context='context', message_id=str(message_id),
+                pending_value='translation')
+            for message_id in range(3)
+        ], language='en')
+        translator.save_translations([
+            TranslatableString(
+                context='context', message_id='0',
+                pending_value='traduction'),
+            TranslatableString(
+                context='other', message_id='0', pending_value=None),
+        ], language='fr')
+
+    def test_coverage(self, session):
+        translator = Translator(Translation, session, 'en')
+        self._populate(translator)
+
+        assert translator.coverage(['en', 'fr']) == {
+            'context': (3, {'en': 3, 'fr': 1}),
+            'other': (1, {'en': 0, 'fr': 0}),
+        }
+        assert translator.coverage(['fr'], group_by=None) == {
+            None: (4, {'fr': 1}),
+        }
+
+    def test_coverage_invalid_group_by(self, session):
+        translator = Translator(Translation, session, 'en')
+        with pytest.raises(ValueError):
+            translator.coverage(['en'], group_by='language')
+
+    def test_summary_reads_lock_rows(self, session):
+        translator = Translator(
+            Translation, session, 'en', summary_model=TranslationSummary)
+        with count_queries(session) as queries:
+            self._populate(translator)
+
+        selects = [query for query in queries if query.startswith('SELECT')]
+        assert selects
+        assert all(query.endswith('FOR UPDATE') for query in selects)
+
+    def test_summary(self, session):
+        translator = Translator(
+            Translation, session, 'en', summary_model=TranslationSummary)
+        self._populate(translator)
+        expected = translator.coverage(['en', 'fr'], use_summary=False)
+        assert translator.coverage(['en', 'fr']) == expected
+
+        translator.save_translation(TranslatableString(
+            context='context', message_id='0', pending_value=None))
+        translator.delete_translations(
+            TranslatableString(context='context', message_id='1'))
+        translator.move_translations_many([(
+            TranslatableString(context='context', message_id='2'),
+            TranslatableString(context='other', message_id='0'),
+        )])
+        expected = translator.coverage(['en', 'fr'], use_summary=False)
+        assert expected == {
+            'context': (1, {'en': 0, 'fr': 1}),
+            'other': (1, {'en': 1, 'fr': 0}),
+        }
+        assert translator.coverage(['en', 'fr']) == expected
+
+        translator.delete_translations_many([
+            TranslatableString(context='other', message_id='0')])
+        expected = translator.coverage(['en', 'fr'], use_summary=False)
+        assert expected == {'context': (1, {'en': 0, 'fr': 1})}
+        assert translator.coverage(['en', 'fr']) == expected
+
+        summary = set(session.query(
+            TranslationSummary.context, TranslationSummary.language,
+            TranslationSummary.count))
+        translator.rebuild_summary()
+        rebuilt = set(session.query(
+            TranslationSummary.context, TranslationSummary.language,
+            TranslationSummary.count))
+        assert summary == rebuilt
+
+
+@pytest.mark.usefixtures('manager')
+class TestSharedCache(object):
+    def test_only_misses_are_loaded(self, session):
+        translation = Translation(
+            context='context', message_id='1',
+            language='language', value='translation')
+        session.add(translation)
+        session.commit()
+
+        cache = TranslationCache()
+        translator = Translator(
+            Translation, session, 'language', shared_cache=cache)
+        translatable = TranslatableString(context='context', message_id='1')
+        missing = TranslatableString(context='context', message_id='2')
+
+        with count_queries(session) as queries:
+            result = translator.translate([translatable, missing])
+        assert result == ['translation', None]
+        assert len(queries) == 1
+
+        with count_queries(session) as queries:
+            result = translator.translate([translatable, missing])
+        assert result == ['translation', None]
+        assert len(queries) == 0
+
+    def test_invalidate_on_write(self, session):
+        cache = TranslationCache()
+        translator = Translator(
+            Translation, session, 'language', shared_cache=cache)
+        params = {
+            'context': 'context',
+            'message_id': 'message_id',
+        }
+        translatable = TranslatableString(**params)
+        assert translator.translate(translatable) is None
+
+        translator.save_translation(
+            TranslatableString(pending_value='translation', **params))
+        assert translator.translate(translatable) == 'translation'
+
+        new_translatable = TranslatableString(
+            context='context', message_id='new_message_id')
+        assert translator.translate(new_translatable) is None
+        translator.move_translations(translatable, new_translatable)
+        assert translator.translate(translatable) is None
+        assert translator.translate(new_translatable) == 'translation'
+
+        translator.delete_translations(new_translatable)
+        assert translator.translate(new_translatable) is None
+
+
+@pytest.mark.usefixtures('manager')
+class TestRequestCache(object):
+    def test_only_unseen_keys_are_loaded(self, session):
+        translation = Translation(
+            context='context', message_id='1',
+            language='language', value='translation')
+        session.add(translation)
+        session.commit()
+
+        translator = Translator(Translation, session, 'language')
+        translatable = TranslatableString(context='context', message_id='1')
+        missing = TranslatableString(context='context', message_id='2')
+
+        cache = TranslationCache()
+        assert translator.translate(translatable, cache=cache) == (
+            'translation')
+        assert (cache.hits, cache.misses, cache.queries) == (0, 1, 1)
+
+        assert translator.translate(
+            [translatable, missing], cache=cache) == ['translation', None]
+        assert (cache.hits, cache.misses, cache.queries) == (1, 2, 2)
+
+        assert translator.translate(
+            [translatable, missing], cache=cache) == ['translation', None]
+        assert (cache.hits, cache.misses, cache.queries) == (3, 2, 2)
@@ -5,17 +5,20 @@ from __future__ import unicode_literals
 import itertools
 
 import pytest
-from sqlalchemy import Column, Text, Integer
+from sqlalchemy import Column, Text, Integer, event
 from sqlalchemy.exc import OperationalError, StatementError
 from sqlalchemy.ext.declarative import declarative_base
 
 from taal import Translator, TRANSLATION_MISSING
 from tests.models import (
     Model, RequiredModel, Translation, Parent, Child, RenamedColumn)
+from taal.sqlalchemy import (
+    TranslatableQuery, bulk_insert_mappings, bulk_update)
 from taal.sqlalchemy.events import flush_log, load
 from taal.sqlalchemy.types import make_from_obj
 from taal.constants import PlaceholderValue
 from taal.translatablestring import TranslatableString, is_translatable_value
+from tests.helpers import count_queries
 
 
 Base = declarative_base()
@@ -177,6 +180,136 @@ def test_bulk_update_normal_field(bound_session):
     bound_session.commit()
 
 
+class TestBulkUpdate(object):
+    def _translator(self, session, session_cls):
+        translator = Translator(Translation, session_cls(), 'language')
+        translator.bind(session)
+        return translator
+
+    def test_to_value(self, session, session_cls):
+        translator = self._translator(session, session_cls)
+        instances = [
+            Model(name='name', identifier=identifier)
+            for identifier in ('a', 'a', 'b')]
+        session.add_all(instances)
+        session.commit()
+
+        query = session.query(Model).filter(Model.identifier == 'a')
+        assert bulk_update(query, {Model.name: 'updated'}) == 2
+        session.commit()
+
+        names = [instance.name for instance in instances]
+        assert translator.translate(names) == ['updated', 'updated', 'name']
+
+    def test_to_none(self, session, session_cls):
+        translator = self._translator(session, session_cls)
+        instances = [Model(name='name') for _ in range(3)]
+        session.add_all(instances)
+        session.commit()
+
+        bulk_update(session.query(Model), {'name': None})
+        session.commit()
+
+        assert [instance.name for instance in instances] == [None] * 3
+        assert translator.session.query(Translation).count() == 0
+
+    def test_rollback(self, session, session_cls):
+        translator = self._translator(session, session_cls)
+        instance = Model(name='name')
+        session.add(instance)
+        session.commit()
+
+        session.begin_nested()
+        bulk_update(session.query(Model), {'name': 'updated'})
+        session.rollback()
+        session.commit()
+
+        assert translator.translate(instance.name) == 'name'
+
+    def test_normal_field(self, bound_session):
+        instance = Model(name='name')
+        bound_session.add(instance)
+        bound_session.commit()
+
+        bulk_update(bound_session.query(Model), {'identifier': 'foo'})
+        bound_session.commit()
+        assert instance.identifier == 'foo'
+
+    def test_query_class(self, session_cls):
+        session = session_cls(query_cls=TranslatableQuery)
+        translator = self._translator(session, session_cls)
+        instance = Model(name='name')
+        session.add(instance)
+        session.commit()
+
+        session.query(Model).update({'name': 'updated'})
+        session.commit()
+
+        assert translator.translate(instance.name) == 'updated'
+
+
+class TestBulkInsertMappings(object):
+    def test_insert(self, session, session_cls):
+        translator = Translator(Translation, session_cls(), 'language')
+        translator.bind(session)
+
+        bulk_insert_mappings(session, Model, [
+            {'id': 1, 'name': 'name 1', 'identifier': 'a'},
+            {'id': 2, 'name': None, 'identifier': 'b'},
+            {'name': 'name 3'},
+        ])
+        assert len(session.identity_map) == 0
+
+        with count_queries(translator.session) as queries:
+            session.commit()
+        upserts = [
+            query for query in queries
+            if query.startswith('INSERT INTO translations')]
+        assert len(upserts) == 1
+
+        instances = session.query(Model).order_by(Model.id).all()
+        assert [instance.identifier for instance in instances] == [
+            'a', 'b', None]
+        assert translator.translate(
+            [instance.name for instance in instances]) == [
+            'name 1', None, 'name 3']
+
+    def test_generated_primary_keys(self, session, session_cls):
+        translator = Translator(Translation, session_cls(), 'language')
+        translator.bind(session)
+
+        with count_queries(session) as queries:
+            bulk_insert_mappings(session, Model, [
+                {'name': 'name 1'},
+                {'identifier': 'b'},
+                {'identifier': 'c'},
+                {'name': 'name 4'},
+                {'id': 1, 'name': 'name 5'},
+            ])
+        inserts = [query for query in queries if query.startswith('INSERT')]
+        # without RETURNING, generated keys are found one row at a time
+        assert len(inserts) == 4
+        session.commit()
+
+        instances = session.query(Model).order_by(Model.id).all()
+        assert [instance.identifier for instance in instances] == [
+            None, 'b', 'c', None, None]
+        assert translator.translate(
+            [instance.name for instance in instances]) == [
+            'name 5', None, None, 'name 1', 'name 4']
+
+    def test_rollback(self, session, session_cls):
+        translator = Translator(Translation, session_cls(), 'language')
+        translator.bind(session)
+
+        bulk_insert_mappings(session, Model, [{'id': 1, 'name': 'name'}])
+        session.rollback()
+        session.commit()
+
+        assert session.query(Model).count() == 0
+        assert translator.session.query(Translation).count() == 0
+
+
 @pytest.mark.parametrize("initial", [None, 'name', ])
 def test_flushing(bound_session, session_cls, initial):
     instance = Model(name=initial)
@@ -253,6 +386,83 @@ class TestSavepoints(object):
         assert session.query(Model).count() == 1
         assert translator.session.query(Translation).count() == 1
 
+    def test_released_savepoint(self, session, session_cls):
+        translator = Translator(Translation, session_cls(), 'language')
+        translator.bind(session)
+
+        session.begin_nested()
+        instance = Model(name='instance')
+        session.add(instance)
+        session.commit()  # releases the savepoint
+
+        # saved with the enclosing transaction
+        assert translator.session.query(Translation).count() == 0
+        assert len(flush_log[session]) == 1
+
+        session.rollback()
+        assert session not in flush_log or len(flush_log[session]) == 0
+        assert translator.session.query(Translation).count() == 0
+
+    def test_savepoint_per_row(self, session, session_cls):
+        translator = Translator(Translation, session_cls(), 'language')
+        translator.bind(session)
+
+        instances = [Model(name='name') for _ in range(3)]
+        session.add_all(instances)
+        session.flush()
+
+        for index, instance in enumerate(instances):
+            session.begin_nested()
+            instance.name = 'first'
+            session.flush()
+            instance.name = 'second'
+            session.flush()
+            if index == 1:
+                session.rollback()
+            else:
+                session.commit()
+
+        # repeated writes to the same field are collapsed
+        assert len(flush_log[session]) == 3
+        session.commit()
+
+        assert translator.translate(
+            [instance.name for instance in instances]) == [
+            'second', 'name', 'second']
+
+
+def test_commit_saves_translations_in_bulk(session, session_cls):
+    translator = Translator(Translation, session_cls(), 'language')
+    translator.bind(session)
+
+    instances = [Model(name='name {}'.format(i)) for i in range(5)]
+    session.add_all(instances)
+    session.commit()
+
+    instances[0].name = None
+    instances[1].name = 'new name'
+    session.delete(instances[2])
+
+    translator_commits = []
+
+    def after_commit(session):
+        translator_commits.append(session)
+
+    event.listen(translator.session, 'after_commit', after_commit)
+    with count_queries(translator.session) as queries:
+        session.commit()
+
+    assert len(translator_commits) == 1
+    upserts = [
+        query for query in queries
+        if query.startswith('INSERT INTO translations')]
+    assert len(upserts) == 1
+
+    assert translator.session.query(Translation).count() == 3
+    remaining = [instances[0], instances[1], instances[3], instances[4]]
+    assert translator.translate([instance.name for instance in remaining]) == [
+        None, 'new name', 'name 3', 'name 4']
+
 
 def test_refresh_with_relationship(bound_session):
     """ regression: refreshing attribute that isn't a column name """
@@ -623,6 +833,100 @@ class TestListTranslations(object):
             ['en'], base_query=base_query)
         assert filtered_query.count() == 2
 
+    def test_context_prefix(self, session):
+        session.add(Translation(
+            context='plant', message_id='1', language='en', value='Tree'))
+        session.add(Translation(
+            context='an%', message_id='1', language='en', value='Other'))
+        session.commit()
+
+        translator = Translator(Translation, session, '')
+        translations = translator.list_translations(
+            ['en'], context_prefix='ani')
+        assert set(translations) == set([
+            ('animal', '1', 'Moose'),
+            ('animal', '2', 'Monkey'),
+            ('animal', '3', None),
+        ])
+
+        # wildcards are matched literally
+        translations = translator.list_translations(
+            ['en'], context_prefix='an%')
+        assert list(translations) == [('an%', '1', 'Other')]
+
+    def test_source_languages(self, session):
+        translator = Translator(Translation, session, '')
+        missing_translations = translator.list_missing_translations(
+            ['en', 'sv'], source_languages=['en'])
+
+        assert list(missing_translations) == [
+            ('animal', '2', 'Monkey', None),
+        ]
+
+    def test_pagination(self, session):
+        translator = Translator(Translation, session, '')
+        page = translator.list_translations(['en'], limit=2)
+        assert list(page) == [
+            ('animal', '1', 'Moose'),
+            ('animal', '2', 'Monkey'),
+        ]
+
+        page = translator.list_translations(
+            ['en'], after=('animal', '2'), limit=2)
+        assert list(page) == [('animal', '3', None)]
+
+    def test_missing_pagination(self, session):
+        translator = Translator(Translation, session, '')
+        page = translator.list_missing_translations(['en', 'sv'], limit=1)
+        assert list(page) == [('animal', '2', 'Monkey', None)]
+
+        page = translator.list_missing_translations(
+            ['en', 'sv'], after=('animal', '2'), limit=1)
+        assert list(page) == [('animal', '3', None, 'Flodhäst')]
+
+    @pytest.mark.parametrize('missing', [False, True])
+    @pytest.mark.parametrize('kwargs', [
+        {},
+        {'context_prefix': 'ani'},
+        {'source_languages': ['sv']},
+        {'after': ('animal', '1'), 'limit': 1},
+    ])
+    def test_pivot(self, session, missing, kwargs):
+        translator = Translator(Translation, session, '')
+        if missing:
+            list_ = translator.list_missing_translations
+        else:
+            list_ = translator.list_translations
+
+        with count_queries(session) as queries:
+            pivoted = list(list_(['en', 'sv'], pivot=True, **kwargs))
+        assert 'JOIN' not in queries[0]
+        assert sorted(pivoted) == sorted(list_(['en', 'sv'], **kwargs))
+
+    def test_pivot_base_query(self, session):
+        translator = Translator(Translation, session, '')
+        base_query = (
+            session
+            .query(Translation.context, Translation.message_id)
+            .filter(Translation.message_id < 3)
+        ).distinct()
+
+        query, values, columns = translator._pivoted_translations(
+            ['en'], base_query=base_query)
+        assert query.count() == 2
+        query = query.having(values[0].is_(None))
+        assert query.count() == 0
+
+    def test_yield_per(self, session):
+        translator = Translator(Translation, session, '')
+        translations = translator.list_translations(['en', 'sv'], yield_per=1)
+
+        assert set(translations) == set([
+            ('animal', '1', 'Moose', 'Älg'),
+            ('animal', '2', 'Monkey', None),
+            ('animal', '3', None, 'Flodhäst'),
+        ])
+
 
 def test_missmatched_attr_and_column(bound_session):
     session = bound_session
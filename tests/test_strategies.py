@@ -6,8 +6,11 @@ import pytest
 
 from taal import Translator, TRANSLATION_MISSING
 from taal.translatablestring import TranslatableString
-from taal.strategies import FallbackLangStrategy
+from taal.strategies import (
+    FallbackChainStrategy, FallbackLangStrategy, NoneStrategy,
+    get_parent_languages)
 
+from tests.helpers import count_queries
 from tests.models import Translation
 
 SAMPLE_CONTEXT = 'context ಠ_ಠ'
@@ -108,3 +111,110 @@ class TestStrategies(object):
         translator.save_translation(translatable)
 
         assert session.query(Translation).count() == 0
+
+
+def test_bind_params_does_not_mutate_strategy():
+    strategy = NoneStrategy()
+    state = dict(strategy.__dict__)
+
+    lookup_en = strategy.bind_params('en', Translation, None)
+    lookup_fr = strategy.bind_params('fr', Translation, None)
+
+    assert strategy.__dict__ == state
+    assert lookup_en is not lookup_fr
+    assert lookup_en.language == 'en'
+    assert lookup_fr.language == 'fr'
+    assert lookup_en.strategy is lookup_fr.strategy is strategy
+
+
+def test_shared_strategy_across_threads(session_cls):
+    from threading import Thread
+
+    session = session_cls()
+    for language in ['en', 'fr']:
+        translation = Translation(
+            context=SAMPLE_CONTEXT,
+            message_id=SAMPLE_MESSAGE_ID,
+            language=language,
+            value='value {}'.format(language),
+        )
+        session.add(translation)
+    session.commit()
+
+    translatable = TranslatableString(
+        context=SAMPLE_CONTEXT, message_id=SAMPLE_MESSAGE_ID)
+    results = {}
+
+    def translate(language):
+        translator = Translator(Translation, session_cls(), language)
+        results[language] = [
+            translator.translate(translatable) for _ in range(20)]
+
+    threads = [Thread(target=translate, args=(language,))
+               for language in ['en', 'fr']]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {
+        'en': ['value en'] * 20,
+        'fr': ['value fr'] * 20,
+    }
+
+
+@pytest.mark.parametrize(('language', 'parents'), [
+    ('en', []),
+    ('fr-CA', ['fr']),
+    ('fr_CA', ['fr']),
+    ('zh-Hant-TW', ['zh-Hant', 'zh']),
+])
+def test_get_parent_languages(language, parents):
+    assert get_parent_languages(language) == parents
+
+
+class TestFallbackChain(object):
+    def test_derived_chain(self):
+        strategy = FallbackChainStrategy(default_lang='en')
+        assert strategy.fallback_chain('fr-CA') == ['fr', 'en']
+        assert strategy.fallback_chain('en-GB') == ['en']
+        assert strategy.fallback_chain('en') == []
+
+    def test_configured_chain(self):
+        strategy = FallbackChainStrategy(
+            fallbacks={'pt-BR': ['pt-PT', 'pt']}, default_lang='en')
+        assert strategy.fallback_chain('pt-BR') == ['pt-PT', 'pt', 'en']
+        assert strategy.fallback_chain('pt-PT') == ['pt', 'en']
+
+    def test_no_derived_chain(self):
+        strategy = FallbackChainStrategy(derive_parents=False)
+        assert strategy.fallback_chain('fr-CA') == []
+
+    def test_translate(self, session):
+        for message_id, language in [
+            ('1', 'fr-CA'),
+            ('2', 'fr'),
+            ('3', 'en'),
+        ]:
+            translation = Translation(
+                context=SAMPLE_CONTEXT, message_id=message_id,
+                language=language, value=language)
+            session.add(translation)
+        session.commit()
+
+        translator = Translator(
+            Translation,
+            session,
+            'fr-CA',
+            strategy=FallbackChainStrategy(default_lang='en'),
+        )
+        translatables = [
+            TranslatableString(context=SAMPLE_CONTEXT, message_id=message_id)
+            for message_id in ['1', '2', '3', '4']
+        ]
+
+        with count_queries(session) as queries:
+            translation = translator.translate(translatables)
+
+        assert len(queries) == 1
+        assert translation == ['fr-CA', 'fr', 'en', TRANSLATION_MISSING]
@@ -3,8 +3,10 @@
 from __future__ import absolute_import, unicode_literals
 
 from taal import Translator
+from taal.translatablestring import TranslatableString
 
-from tests.models import Model, Translation
+from tests.helpers import count_queries
+from tests.models import Model, Translation, TranslationSuggestion
 
 
 def test_basic(session_cls):
@@ -83,3 +85,127 @@ def test_unknown_language(session_cls):
 
     assert translator.suggest_translation(model.name, 'en', 'foo') is None
     assert translator.suggest_translation(model.name, 'foo', 'en') is None
+
+
+def test_suggest_translations(session_cls):
+    session_en = session_cls()
+    translator_en = Translator(Translation, session_cls(), 'en')
+    translator_en.bind(session_en)
+
+    session_fr = session_cls()
+    translator_fr = Translator(Translation, session_cls(), 'fr')
+    translator_fr.bind(session_fr)
+
+    for en, fr in [('a', '1'), ('a', '2'), ('a', '2'), ('b', 'b_fr')]:
+        model = Model(name=en)
+        session_en.add(model)
+        session_en.commit()
+        translatable = model.name
+        translatable.pending_value = fr
+        translator_fr.save_translation(translatable)
+
+    models = [Model(name=name) for name in ['a', 'b', 'c']]
+    session_en.add_all(models)
+    session_en.commit()
+    translatables = [model.name for model in models]
+
+    with count_queries(translator_fr.session) as queries:
+        suggestions = translator_fr.suggest_translations(
+            translatables, 'en', 'fr', chunk_size=2)
+
+    assert len(queries) == 2
+    assert suggestions == dict(
+        ((translatable.context, translatable.message_id), suggestion)
+        for translatable, suggestion in zip(translatables, ['2', 'b_fr', None])
+    )
+    assert [
+        translator_fr.suggest_translation(translatable, 'en', 'fr')
+        for translatable in translatables
+    ] == ['2', 'b_fr', None]
+
+
+def test_suggest_translations_tie(session_cls):
+    session_en = session_cls()
+    translator_en = Translator(Translation, session_cls(), 'en')
+    translator_en.bind(session_en)
+
+    session_fr = session_cls()
+    translator_fr = Translator(Translation, session_cls(), 'fr')
+    translator_fr.bind(session_fr)
+
+    for fr in ['2', '1']:
+        model = Model(name='a')
+        session_en.add(model)
+        session_en.commit()
+        translatable = model.name
+        translatable.pending_value = fr
+        translator_fr.save_translation(translatable)
+
+    model = Model(name='a')
+    session_en.add(model)
+    session_en.commit()
+
+    key = (model.name.context, model.name.message_id)
+    assert translator_fr.suggest_translations(
+        [model.name], 'en', 'fr') == {key: '1'}
+
+
+def _index_rows(session):
+    return set(session.query(
+        TranslationSuggestion.context,
+        TranslationSuggestion.from_language,
+        TranslationSuggestion.value_hash,
+        TranslationSuggestion.to_language,
+        TranslationSuggestion.to_value,
+        TranslationSuggestion.count,
+    ).filter(TranslationSuggestion.count != 0))
+
+
+def test_suggestion_index(session):
+    translator = Translator(
+        Translation, session, 'en', suggestion_model=TranslationSuggestion)
+
+    def save(message_id, value, language):
+        translator.save_translations([TranslatableString(
+            context='context', message_id=message_id, pending_value=value,
+        )], language=language)
+
+    for message_id, (en, fr) in enumerate(
+            [('a', '1'), ('a', '2'), ('a', '2'), ('b', 'b_fr')]):
+        save(str(message_id), en, 'en')
+        save(str(message_id), fr, 'fr')
+    save('new_a', 'a', 'en')
+    save('new_b', 'b', 'en')
+
+    translatables = [
+        TranslatableString(context='context', message_id=message_id)
+        for message_id in ['new_a', 'new_b', '3']
+    ]
+    with count_queries(session) as queries:
+        suggestions = translator.suggest_translations(
+            translatables, 'en', 'fr')
+    assert len(queries) == 2
+    assert [
+        suggestions[(translatable.context, translatable.message_id)]
+        for translatable in translatables
+    ] == ['2', 'b_fr', 'b_fr']
+    assert translator.suggest_translation(translatables[2], 'fr', 'en') == 'b'
+
+    save('1', None, 'fr')
+    translator.delete_translations(
+        TranslatableString(context='context', message_id='2'))
+    translator.move_translations_many([(
+        TranslatableString(context='context', message_id='3'),
+        TranslatableString(context='other', message_id='3'),
+    )])
+    assert translator.suggest_translations(
+        translatables, 'en', 'fr') == translator.suggest_translations(
+        translatables, 'en', 'fr', use_index=False)
+
+    # rows no longer counting anything are deleted
+    assert session.query(TranslationSuggestion).filter(
+        TranslationSuggestion.count <= 0).count() == 0
+
+    rows = _index_rows(session)
+    translator.rebuild_suggestion_index(chunk_size=2)
+    assert _index_rows(session) == rows
@@ -1,7 +1,13 @@
+import threading
+
 import pytest
+from sqlalchemy.orm import scoped_session
 
 from taal import Translator
 from taal.exceptions import BindError
+from taal.translatablestring import TranslatableString
+
+from tests.models import Translation
 
 
 def test_bind_unknown():
@@ -48,3 +54,81 @@ def test_dynamic_language():
 
     language = 'bar'
     assert translator.language == 'bar'
+
+
+def test_session_factory():
+    session = object()
+    translator = Translator(None, lambda: session, None)
+    assert translator.session is session
+    assert translator.read_session is session
+
+
+def test_session_per_thread(session_cls):
+    translator = Translator(Translation, session_cls, 'language')
+    sessions = []
+    thread = threading.Thread(
+        target=lambda: sessions.append(translator.session))
+    thread.start()
+    thread.join()
+
+    assert translator.session is translator.session
+    assert sessions[0] is not translator.session
+
+
+def test_close_owned_sessions(session_cls):
+    translator = Translator(
+        Translation, session_cls, 'language', read_session=session_cls)
+    session = translator.session
+    read_session = translator.read_session
+    assert session is not read_session
+
+    translator.close()
+    assert translator.session is not session
+    assert translator.read_session is not read_session
+
+
+def test_close_leaves_scoped_session(session_cls):
+    scoped = scoped_session(session_cls)
+    translator = Translator(
+        Translation, scoped, 'language', read_session=scoped)
+    session = scoped()
+    translation = Translation(
+        context='context', message_id='message_id', language='language',
+        value='value')
+    session.add(translation)
+    session.flush()
+
+    assert translator.session is session
+    assert translator.translate(TranslatableString(
+        context='context', message_id='message_id')) == 'value'
+    translator.close()
+
+    assert scoped() is session
+    assert translation in session
+    scoped.remove()
+
+
+def test_lookups_use_read_session(session_cls):
+    read_session = session_cls()
+    read_session.add(Translation(
+        context='context', message_id='message_id', language='language',
+        value='value'))
+    read_session.flush()  # only visible in this transaction
+
+    translatable = TranslatableString(
+        context='context', message_id='message_id')
+    translator = Translator(
+        Translation, session_cls(), 'language', read_session=read_session)
+    assert translator.translate(translatable) == 'value'
+
+    translator = Translator(Translation, session_cls(), 'language')
+    assert translator.translate(translatable) is None
+    read_session.rollback()
+
+
+def test_read_session():
+    session = object()
+    read_session = object()
+    translator = Translator(None, session, None, read_session=read_session)
+    assert translator.session is session
+    assert translator.read_session is read_session
@@ -0,0 +1,78 @@
+from __future__ import absolute_import
+
+import pytest
+from sqlalchemy.dialects import mysql, postgresql
+
+from taal.utils import Upsert, chunked, key_filter
+
+from tests.models import Translation
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_chunked_exact():
+    assert list(chunked(range(4), 2)) == [[0, 1], [2, 3]]
+
+
+def test_chunked_empty():
+    assert list(chunked([], 2)) == []
+
+
+def test_upsert_mysql():
+    upsert = Upsert(
+        Translation.__table__,
+        [{'context': 'c', 'message_id': 'm', 'language': 'l', 'value': 'v'}],
+        ['value'],
+    )
+    statement = str(upsert.compile(dialect=mysql.dialect()))
+    assert statement.startswith('INSERT INTO translations')
+    assert statement.endswith(
+        'ON DUPLICATE KEY UPDATE value = VALUES(value)')
+
+
+def test_upsert_postgresql():
+    upsert = Upsert(
+        Translation.__table__,
+        [{'context': 'c', 'message_id': 'm', 'language': 'l', 'value': 'v'}],
+        ['value'],
+    )
+    statement = str(upsert.compile(dialect=postgresql.dialect()))
+    assert statement.startswith('INSERT INTO translations')
+    assert statement.endswith(
+        'ON CONFLICT (context, message_id, language) '
+        'DO UPDATE SET value = excluded.value')
+
+
+def test_upsert_increment():
+    upsert = Upsert(
+        Translation.__table__,
+        [{'context': 'c', 'message_id': 'm', 'language': 'l', 'value': 'v'}],
+        ['value'],
+        increment=True,
+    )
+    statement = str(upsert.compile(dialect=mysql.dialect()))
+    assert statement.endswith(
+        'ON DUPLICATE KEY UPDATE value = value + VALUES(value)')
+
+    statement = str(upsert.compile(dialect=postgresql.dialect()))
+    assert statement.endswith(
+        'DO UPDATE SET value = translations.value + excluded.value')
+
+
+@pytest.mark.parametrize('version,composite', [
+    (None, False),
+    ((5, 6, 30), False),
+    ((5, 7, 3), True),
+])
+def test_key_filter_mysql_version(version, composite):
+    dialect = mysql.dialect()
+    dialect.server_version_info = version
+    keys = [('c1', 'm1'), ('c1', 'm2'), ('c2', 'm1')]
+    statement = str(key_filter(Translation, keys, dialect).compile(
+        dialect=dialect))
+    if composite:
+        assert statement.startswith('(translations.context, ')
+    else:
+        assert statement.count('translations.message_id IN') == 2
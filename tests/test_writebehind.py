@@ -0,0 +1,250 @@
+from __future__ import absolute_import
+
+import threading
+
+import pytest
+from mock import patch
+
+from taal import TRANSLATION_MISSING, Translator
+from taal.cache import TranslationCache
+from taal.exceptions import QueueFull
+from taal.translatablestring import TranslatableString
+from taal.writebehind import WriteBehindQueue
+
+from tests.models import Translation
+
+
+@pytest.fixture
+def queue(request, session_cls):
+    queue = WriteBehindQueue(Translation, session_cls)
+    request.addfinalizer(queue.close)
+    return queue
+
+
+def stored(session):
+    return sorted(
+        (translation.message_id, translation.language, translation.value)
+        for translation in session.query(Translation))
+
+
+def test_save(session, queue):
+    translator = Translator(
+        Translation, session, 'language', write_behind=queue)
+    translator.save_translations([
+        TranslatableString('context', 'message_id', 'value'),
+        TranslatableString('context', 'other_id', 'other value'),
+    ])
+    # read your writes
+    assert translator.translate(
+        TranslatableString('context', 'message_id')) == 'value'
+
+    queue.flush()
+    assert len(queue) == 0
+    assert stored(session) == [
+        ('message_id', 'language', 'value'),
+        ('other_id', 'language', 'other value'),
+    ]
+
+
+def test_session_not_committed(session, queue):
+    translator = Translator(
+        Translation, session, 'language', write_behind=queue)
+    session.add(Translation(
+        context='context', message_id='unrelated', language='language',
+        value='value'))
+
+    translator.save_translation(
+        TranslatableString('context', 'message_id', 'value'))
+    translator.delete_translations(
+        TranslatableString('context', 'other_id'))
+    session.rollback()
+
+    queue.flush()
+    assert stored(session) == [('message_id', 'language', 'value')]
+
+
+def test_coalescing(session, queue):
+    translator = Translator(
+        Translation, session, 'language', write_behind=queue)
+    translator.save_translation(
+        TranslatableString('context', 'message_id', 'value'))
+    queue.flush()
+
+    with patch.object(
+            WriteBehindQueue, '_write', autospec=True,
+            side_effect=WriteBehindQueue._write) as write:
+        translator.save_translation(
+            TranslatableString('context', 'message_id', 'first'))
+        translator.save_translation(
+            TranslatableString('context', 'message_id', 'second'))
+        translator.delete_translations(
+            TranslatableString('context', 'message_id'))
+        translator.save_translation(
+            TranslatableString('context', 'other_id', 'value'))
+        translatables = [
+            TranslatableString('context', 'message_id'),
+            TranslatableString('context', 'other_id'),
+        ]
+        assert translator.translate(translatables) == [None, 'value']
+        queue.flush()
+
+    assert translator.translate(translatables) == [None, 'value']
+    assert stored(session) == [('other_id', 'language', 'value')]
+    # at most one write per queued batch
+    assert write.call_count <= 2
+
+
+def test_invalidates_shared_cache(session, session_cls):
+    cache = TranslationCache()
+    queue = WriteBehindQueue(Translation, session_cls, shared_cache=cache)
+    translator = Translator(
+        Translation, session, 'language', shared_cache=cache,
+        write_behind=queue)
+    other = Translator(
+        Translation, session_cls(), 'language', shared_cache=cache)
+    translatable = TranslatableString('context', 'message_id')
+
+    assert other.translate(translatable) is None
+    translator.save_translation(
+        TranslatableString('context', 'message_id', 'value'))
+    queue.close()
+    assert other.translate(translatable) == 'value'
+
+
+def test_queue_full(session, session_cls):
+    queue = WriteBehindQueue(
+        Translation, session_cls, max_pending=1, timeout=0)
+    translator = Translator(
+        Translation, session, 'language', write_behind=queue)
+
+    writing = threading.Event()
+    proceed = threading.Event()
+
+    def blocked_write(queue, translator, batch):
+        writing.set()
+        proceed.wait()
+
+    with patch.object(WriteBehindQueue, '_write', blocked_write):
+        translator.save_translation(
+            TranslatableString('context', 'message_id_1', 'value'))
+        writing.wait()
+        # the first write is in flight, leaving space for one more
+        translator.save_translation(
+            TranslatableString('context', 'message_id_2', 'value'))
+        # coalesced with the write already queued
+        translator.save_translation(
+            TranslatableString('context', 'message_id_2', 'other value'))
+        with pytest.raises(QueueFull):
+            translator.save_translation(
+                TranslatableString('context', 'message_id_3', 'value'))
+        proceed.set()
+        queue.close()
+
+
+def test_queue_full_queues_nothing(session, session_cls):
+    queue = WriteBehindQueue(
+        Translation, session_cls, max_pending=1, timeout=0)
+    translator = Translator(
+        Translation, session, 'language', write_behind=queue)
+
+    writing = threading.Event()
+    proceed = threading.Event()
+
+    def blocked_write(queue, translator, batch):
+        writing.set()
+        proceed.wait()
+
+    with patch.object(WriteBehindQueue, '_write', blocked_write):
+        translator.save_translation(
+            TranslatableString('context', 'message_id_1', 'value'))
+        writing.wait()
+        translator.save_translation(
+            TranslatableString('context', 'message_id_2', 'value'))
+
+        with pytest.raises(QueueFull):
+            translator.save_translations([
+                TranslatableString('context', 'message_id_2', 'new value'),
+                TranslatableString('context', 'message_id_3', 'value'),
+            ])
+        assert translator.translate(
+            TranslatableString('context', 'message_id_2')) == 'value'
+        assert len(queue) == 2
+        proceed.set()
+        queue.close()
+
+
+def test_overlay_null_values(session, queue):
+    translator = Translator(
+        Translation, session, 'language',
+        strategy=Translator.strategies.SENTINEL_VALUE, write_behind=queue)
+    translatables = [
+        TranslatableString('context', 'message_id'),
+        TranslatableString('context', 'other_id'),
+    ]
+    translator.save_translations([
+        TranslatableString('context', 'message_id', 'value'),
+        TranslatableString('context', 'other_id', 'value'),
+    ])
+    queue.flush()
+
+    # saved as NULL, rather than deleted
+    translator.save_translation(
+        TranslatableString('context', 'message_id', None))
+    translator.delete_translations(
+        TranslatableString('context', 'other_id'))
+    expected = [None, TRANSLATION_MISSING]
+    assert translator.translate(translatables) == expected
+    queue.flush()
+    assert translator.translate(translatables) == expected
+
+
+def test_failed_write(session, queue):
+    translator = Translator(
+        Translation, session, 'language', write_behind=queue)
+
+    with patch.object(
+            WriteBehindQueue, '_write', side_effect=ValueError('boom')):
+        translator.save_translation(
+            TranslatableString('context', 'message_id', 'value'))
+        with pytest.raises(ValueError):
+            queue.flush()
+
+    # dropped, and only raised once
+    queue.flush()
+    assert stored(session) == []
+
+
+def test_failed_session_factory(session, session_cls):
+    calls = []
+
+    def session_factory():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ValueError('boom')
+        return session_cls()
+
+    queue = WriteBehindQueue(Translation, session_factory)
+    translator = Translator(
+        Translation, session, 'language', write_behind=queue)
+
+    translator.save_translation(
+        TranslatableString('context', 'message_id', 'value'))
+    with pytest.raises(ValueError):
+        queue.flush()
+    assert len(queue) == 0
+
+    # a new worker is started for the next write
+    translator.save_translation(
+        TranslatableString('context', 'message_id', 'value'))
+    queue.close()
+    assert stored(session) == [('message_id', 'language', 'value')]
+
+
+def test_closed(session, queue):
+    translator = Translator(
+        Translation, session, 'language', write_behind=queue)
+    queue.close()
+
+    with pytest.raises(RuntimeError):
+        translator.save_translation(
+            TranslatableString('context', 'message_id', 'value'))